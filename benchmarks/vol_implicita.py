@@ -0,0 +1,70 @@
+"""
+Comparação entre bs_implied_vol (uma opção por vez) e bs_implied_vol_lote (todas as opções de uma vez).
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core.fatores_risco.black_scholes import bs_gregas, bs_implied_vol, bs_implied_vol_lote
+
+SENTINELA = 9999999
+VEGA_MINIMA = 1e-4 # Abaixo disso o preço praticamente não depende da vol, que fica mal identificada
+
+
+def gerar_opcoes(n: int, semente: int) -> dict:
+    # Opções aleatórias com preço obtido de uma volatilidade conhecida
+    rng = np.random.default_rng(semente)
+    opcoes = {
+        "S": rng.uniform(50, 150, n),
+        "K": np.full(n, 100.0),
+        "t": rng.uniform(0.05, 2, n),
+        "vol": rng.uniform(5, 90, n),
+        "tipo": rng.choice([1, -1], n)
+    }
+    gregas = bs_gregas(opcoes["S"], opcoes["K"], opcoes["t"], 0, 0, opcoes["vol"], opcoes["tipo"], 1)
+    opcoes["preco"], opcoes["vega"] = gregas["preco"], gregas["vega"]
+    return opcoes
+
+
+def main(n: int, semente: int) -> None:
+    o = gerar_opcoes(n, semente)
+
+    # Solver em lote
+    inicio = time.perf_counter()
+    lote = bs_implied_vol_lote(o["S"], o["K"], o["t"], 0, 0, o["preco"], o["tipo"], 1)
+    tempo_lote = time.perf_counter() - inicio
+
+    # Solver escalar, opção a opção
+    inicio = time.perf_counter()
+    escalar = np.array([
+        bs_implied_vol(o["S"][i], o["K"][i], o["t"][i], 0, 0, o["preco"][i], int(o["tipo"][i]), 1)
+        for i in range(n)
+    ], dtype=float)
+    tempo_escalar = time.perf_counter() - inicio
+
+    # Comparar apenas opções em que ambos convergiram
+    convergiu_escalar = escalar != SENTINELA
+    ambos = lote["convergiu"] & convergiu_escalar
+    relevantes = ambos & (o["vega"] > VEGA_MINIMA)
+
+    print(f"opções: {n} (semente {semente})")
+    print(f"tempo lote: {tempo_lote:.4f}s | tempo escalar: {tempo_escalar:.4f}s | razão: {tempo_escalar / tempo_lote:.0f}x")
+    print(f"convergência lote: {lote['convergiu'].mean():.2%} | escalar: {convergiu_escalar.mean():.2%}")
+    print(f"iterações do lote (mediana): {np.median(lote['iteracoes'][lote['convergiu']]):.0f}")
+    for nome, filtro in [("ambos convergiram", ambos), (f"e vega > {VEGA_MINIMA:g}", relevantes)]:
+        print(
+            f"max |Δvol| ({nome}, {filtro.sum()} opções): "
+            f"lote vs escalar {np.abs(lote['vol'][filtro] - escalar[filtro]).max():.3e} | "
+            f"lote vs verdadeira {np.abs(lote['vol'][filtro] - o['vol'][filtro]).max():.3e} | "
+            f"escalar vs verdadeira {np.abs(escalar[filtro] - o['vol'][filtro]).max():.3e}"
+        )
+    print(f"sem convergência: lote retorna NaN ({np.isnan(lote['vol']).sum()}), escalar retorna {SENTINELA} ({(~convergiu_escalar).sum()})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--semente", type=int, default=0)
+    argumentos = parser.parse_args()
+    main(argumentos.n, argumentos.semente)
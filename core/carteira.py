@@ -1,12 +1,16 @@
 from datetime import date
 from typing import Union
 
+from numpy import array, bincount, empty, fromiter, int8, int32, ndarray
+
 from inputs.data_handler import InputsDataHandler
-from utils.enums import Colunas, AcoesBr, AcoesUs, Opcoes, Titulos, Futuros, TipoFuturo, TipoTitulo, FatoresRisco, Localidade, \
-                        definir_tipo_futuro, definir_produto_opcao, definir_tipo_titulo
+from inputs.instrumentos import Instrumento
+from utils.enums import AcoesBr, AcoesUs, Opcoes, Titulos, Futuros, FatoresRisco, Localidade
 
 
 class Posicao:
+    __slots__ = ("ativo", "quantidade", "instrumento", "produto", "vencimento", "cupom", "taxa")
+
     def __init__(
             self, 
             ativo: Union[AcoesBr, AcoesUs, Opcoes, Titulos, Futuros], 
@@ -15,83 +19,114 @@ class Posicao:
     ):
         self.ativo = ativo
         self.quantidade = quantidade
-        self._gerar_informacao_adicional(inputs_data_handler)
-        self._gerar_informacao_juros(inputs_data_handler)
-
-    def _gerar_informacao_adicional(self, inputs_data_handler: InputsDataHandler) -> None:
-        # Extrair informações adicionais sobre futuros, títulos e opções
-        if isinstance(self.ativo, Futuros):
-            df = inputs_data_handler.futuros()
-            tipo_futuro = df[df[Colunas.ID.value] == self.ativo.value]["tipo"].values[0]
-            self.produto = definir_tipo_futuro(tipo_futuro)
-        elif isinstance(self.ativo, Titulos):
-            df = inputs_data_handler.titulos()
-            produto = df[df[Colunas.ID.value] == self.ativo.value]["tipo"].values[0]
-            self.produto = definir_tipo_titulo(produto)
-        elif isinstance(self.ativo, Opcoes):
-            df = inputs_data_handler.opcoes()
-            produto = df[df[Colunas.ID.value] == self.ativo.value]["underlying"].values[0]
-            self.produto = definir_produto_opcao(produto)
-
-    def _gerar_informacao_juros(self, inputs_data_handler: InputsDataHandler) -> None:
-        # Não implementado para posições sem a presença de juros como fator de risco
-        if FatoresRisco.JUROS not in self.fatores_risco:
-            return None
-        
-        # Extrair informações necessárias dependendo do tipo de fonte
-        if isinstance(self.ativo, Titulos):
-            df = inputs_data_handler.titulos()
-            df = df.loc[df[Colunas.ID.value] == self.ativo.value]
-            self.vencimento = df[Colunas.VENCIMENTO.value].values[0]
-            self.cupom = df["cupom"].values[0]
-            self.taxa = df["taxa"].values[0]
-
-        elif isinstance(self.ativo, Futuros):
-            df = inputs_data_handler.futuros()
-            df = df.loc[df[Colunas.ID.value] == self.ativo.value]
-            self.vencimento = df[Colunas.VENCIMENTO.value].values[0]
-            self.cupom = None
-            self.taxa = None
-        
+        self._definir_instrumento(inputs_data_handler.instrumentos().obter(ativo))
+
+    @classmethod
+    def em_lote(
+            cls,
+            ativos: list[Union[AcoesBr, AcoesUs, Opcoes, Titulos, Futuros]],
+            quantidades: Union[list[float], ndarray],
+            inputs_data_handler: InputsDataHandler
+    ) -> list["Posicao"]:
+        assert len(ativos) == len(quantidades), "Ativos e quantidades devem ter o mesmo tamanho."
+
+        # Resolver cadastro de cada ativo no registro compartilhado, sem reler os dados das carteiras
+        registro = inputs_data_handler.instrumentos()
+        return [cls.de_instrumento(registro.obter(ativo), quantidade) for ativo, quantidade in zip(ativos, quantidades)]
+
+    @classmethod
+    def de_instrumento(cls, instrumento: Instrumento, quantidade: float) -> "Posicao":
+        posicao = cls.__new__(cls)
+        posicao.ativo = instrumento.ativo
+        posicao.quantidade = quantidade
+        posicao._definir_instrumento(instrumento)
+        return posicao
+
+    def _definir_instrumento(self, instrumento: Instrumento) -> None:
+        self.instrumento = instrumento
+
+        # Informações adicionais sobre futuros, títulos e opções
+        if instrumento.produto is not None:
+            self.produto = instrumento.produto
+
+        # Informações de juros apenas para posições com juros como fator de risco
+        if FatoresRisco.JUROS in instrumento.fatores_risco:
+            self.vencimento = instrumento.vencimento
+            self.cupom = instrumento.cupom
+            self.taxa = instrumento.taxa
+
     @property
     def localidade(self) -> Localidade:
-        if (not isinstance(self.ativo, AcoesUs)) and (not isinstance(self.ativo, Titulos)):
-            return Localidade.BR
-        elif isinstance(self.ativo, Titulos) and not self.produto == TipoTitulo.TREASURY:
-            return Localidade.BR
-        else:
-            return Localidade.US
+        return self.instrumento.localidade
 
     @property
     def fatores_risco(self) -> tuple[FatoresRisco]:
-        adicional_cambio = (FatoresRisco.CAMBIO_USDBRL,) if self.localidade == Localidade.US else ()
-        if isinstance(self.ativo, Union[AcoesBr, AcoesUs]):
-            fatores_risco = FatoresRisco.ACAO,
-        elif isinstance(self.ativo, Opcoes):
-            fatores_risco = FatoresRisco.ACAO, FatoresRisco.VOLATILIDADE
-        elif isinstance(self.ativo, Titulos):
-            fatores_risco = FatoresRisco.JUROS,
-        elif isinstance(self.ativo, Futuros):
-            if self.produto == TipoFuturo.USDBRL:
-                fatores_risco = FatoresRisco.CAMBIO_USDBRL,
-            if self.produto in [TipoFuturo.EURUSD, TipoFuturo.USDCAD, TipoFuturo.USDJPY, TipoFuturo.USDMXN]:
-                fatores_risco = FatoresRisco.CAMBIO_USDOUTROS,
-            elif self.produto == TipoFuturo.DI:
-                fatores_risco = FatoresRisco.JUROS,
-            elif self.produto == TipoFuturo.IBOV:
-                fatores_risco = FatoresRisco.ACAO,
-            else:
-                raise ValueError("Fator de risco desconhecido para o respectivo ativo.")    
-        else:
-            raise ValueError("Fator de risco desconhecido para o respectivo ativo.")
-        
-        return tuple(set(fatores_risco + adicional_cambio))
+        return self.instrumento.fatores_risco
         
 
 class Carteira:
+    """
+    Carteira de posições, com arrays paralelos por posição (instrumento, quantidade, classe e fatores de risco).
+    """
+    CLASSES_ATIVOS = (AcoesBr, AcoesUs, Opcoes, Titulos, Futuros)
+    FATORES_RISCO = tuple(FatoresRisco)
+
+    __slots__ = ("data_referencia", "posicoes", "instrumentos", "codigos", "quantidades", "classes", "mascara_fatores_risco")
+
     def __init__(self, posicoes: list[Posicao], data_referencia: date):
         self.data_referencia = data_referencia
-        
-        for i, posicao in enumerate(posicoes, start=1):
-            atributo = f"POSICAO_{i}"
-            setattr(self, atributo, posicao)
+        self.posicoes = list(posicoes)
+
+        # Codificar instrumentos distintos da carteira
+        indices: dict = {}
+        self.instrumentos: list[Instrumento] = []
+        self.codigos = empty(len(self.posicoes), dtype=int32)
+        for i, posicao in enumerate(self.posicoes):
+            codigo = indices.get(posicao.ativo)
+            if codigo is None:
+                codigo = indices[posicao.ativo] = len(self.instrumentos)
+                self.instrumentos.append(posicao.instrumento)
+            self.codigos[i] = codigo
+
+        self.quantidades = fromiter((p.quantidade for p in self.posicoes), dtype=float, count=len(self.posicoes))
+
+        # Classe e fatores de risco são propriedades do instrumento: calcular uma vez por instrumento
+        classes = array([self.CLASSES_ATIVOS.index(type(i.ativo)) for i in self.instrumentos], dtype=int8)
+        mascara = array(
+            [[fr in i.fatores_risco for fr in self.FATORES_RISCO] for i in self.instrumentos],
+            dtype=bool
+        ).reshape(len(self.instrumentos), len(self.FATORES_RISCO))
+        self.classes = classes[self.codigos]
+        self.mascara_fatores_risco = mascara[self.codigos]
+
+    @classmethod
+    def de_arrays(
+            cls,
+            ativos: list[Union[AcoesBr, AcoesUs, Opcoes, Titulos, Futuros]],
+            quantidades: Union[list[float], ndarray],
+            data_referencia: date,
+            inputs_data_handler: InputsDataHandler
+    ) -> "Carteira":
+        return cls(Posicao.em_lote(ativos, quantidades, inputs_data_handler), data_referencia)
+
+    def __len__(self) -> int:
+        return len(self.posicoes)
+
+    def __iter__(self):
+        return iter(self.posicoes)
+
+    def quantidades_por_instrumento(self) -> ndarray:
+        return bincount(self.codigos, weights=self.quantidades, minlength=len(self.instrumentos))
+
+    def posicoes_agregadas(self) -> list[Posicao]:
+        # Uma posição por instrumento distinto, com a soma das quantidades da carteira
+        return [
+            Posicao.de_instrumento(instrumento, float(quantidade))
+            for instrumento, quantidade in zip(self.instrumentos, self.quantidades_por_instrumento())
+        ]
+
+    def posicoes_classe(self, classe: type) -> ndarray:
+        return (self.classes == self.CLASSES_ATIVOS.index(classe)).nonzero()[0]
+
+    def posicoes_fator_risco(self, fator_risco: FatoresRisco) -> ndarray:
+        return self.mascara_fatores_risco[:, self.FATORES_RISCO.index(fator_risco)].nonzero()[0]
@@ -53,6 +53,41 @@ def bs_vega(S, K, t, R, Q, vol, call_put, tipo_tx):
     else:
         raise ValueError("Valores inválidos.")
 
+def bs_gregas(S, K, t, R, Q, vol, call_put, tipo_tx):
+    # Preço e gregas em uma única passada, com suporte a broadcasting de todos os argumentos
+    # (inclusive call_put, permitindo misturar calls e puts)
+    R = ajustar_taxa(R, tipo_tx)
+    Q = ajustar_taxa(Q, tipo_tx)
+
+    w = np.asarray(call_put, dtype=float)
+    if not np.isin(w, [1, -1]).all():
+        raise ValueError("Valores inválidos.")
+
+    a = np.log(S / K)
+    B = ((R / 100) - (Q / 100) + 0.5 * (vol / 100) ** 2) * t
+    c = (vol / 100) * np.sqrt(t)
+    d1 = (a + B) / c
+    d2 = d1 - c
+
+    # Termos compartilhados entre preço e gregas
+    desconto_q = np.exp(-(Q / 100) * t)
+    desconto_r = np.exp(-(R / 100) * t)
+    cdf_d1 = norm.cdf(w * d1)
+    cdf_d2 = norm.cdf(w * d2)
+    pdf_d1 = norm.pdf(d1)
+
+    return {
+        "preco": w * (S * desconto_q * cdf_d1 - K * desconto_r * cdf_d2),
+        "delta": w * desconto_q * cdf_d1,
+        "gamma": desconto_q * pdf_d1 / (S * c),
+        "vega": S * np.sqrt(t) * pdf_d1 * desconto_q,
+        "theta": (
+            -S * desconto_q * pdf_d1 * (vol / 100) / (2 * np.sqrt(t))
+            - w * (R / 100) * K * desconto_r * cdf_d2
+            + w * (Q / 100) * S * desconto_q * cdf_d1
+        )
+    }
+
 def bs_implied_vol(S, K, t, R, Q, price, call_put, tipo_tx, tol=1e-9, max_iter=1000):
     vol_left = 1
     vol_right = 100
@@ -95,4 +130,66 @@ def bs_implied_vol(S, K, t, R, Q, price, call_put, tipo_tx, tol=1e-9, max_iter=1
         if abs((new_mid - vol_mid) / new_mid) < tol:
             return new_mid
 
-    return 9999999
\ No newline at end of file
+    return 9999999
+
+def bs_implied_vol_lote(S, K, t, R, Q, price, call_put, tipo_tx, tol=1e-9, max_iter=100, vol_min=1e-3, vol_max=1000):
+    # Volatilidade implícita de várias opções simultaneamente, via Newton (com vega) protegido por bisseção.
+    # Retorna a volatilidade (NaN quando não há convergência), a indicação de convergência e as iterações.
+    S, K, t, R, Q, price, w = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, t, R, Q, price, call_put)))
+    forma = S.shape
+    S, K, t, R, Q, price, w = (x.ravel() for x in (S, K, t, R, Q, price, w))
+    if not np.isin(w, [1, -1]).all():
+        raise ValueError("Valores inválidos.")
+
+    # Limites de não-arbitragem: fora deles não existe volatilidade que reproduza o preço
+    S_desc = S * np.exp(-(ajustar_taxa(Q, tipo_tx) / 100) * t)
+    K_desc = K * np.exp(-(ajustar_taxa(R, tipo_tx) / 100) * t)
+    intrinseco = np.maximum(w * (S_desc - K_desc), 0)
+    limite_superior = np.where(w == 1, S_desc, K_desc)
+    valido = (t > 0) & (price > intrinseco) & (price < limite_superior)
+
+    # Aproximação inicial de Corrado-Miller, sobre o preço equivalente da call (paridade put-call)
+    preco_call = price + (w == -1) * (S_desc - K_desc)
+    meio = preco_call - (S_desc - K_desc) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol = 100 * np.sqrt(2 * np.pi) / (S_desc + K_desc) * (
+            meio + np.sqrt(np.maximum(meio ** 2 - (S_desc - K_desc) ** 2 / np.pi, 0))
+        ) / np.sqrt(t)
+    vol = np.clip(np.where(np.isfinite(vol) & (vol > 0), vol, 20.0), vol_min, vol_max)
+
+    vol_esq = np.full(vol.shape, vol_min, dtype=float)
+    vol_dir = np.full(vol.shape, vol_max, dtype=float)
+    convergiu = np.zeros(vol.shape, dtype=bool)
+    iteracoes = np.zeros(vol.shape, dtype=int)
+
+    # Iterar apenas elementos ainda não convergidos
+    ativos = np.flatnonzero(valido)
+    for _ in range(max_iter):
+        if not ativos.size:
+            break
+        a = ativos
+        gregas = bs_gregas(S[a], K[a], t[a], R[a], Q[a], vol[a], w[a], tipo_tx)
+        erro = gregas["preco"] - price[a]
+
+        # Estreitar o intervalo que contém a raiz (preço crescente na volatilidade)
+        acima = erro > 0
+        vol_dir[a] = np.where(acima, vol[a], vol_dir[a])
+        vol_esq[a] = np.where(acima, vol_esq[a], vol[a])
+
+        # Passo de Newton (vega por ponto percentual de volatilidade), com bisseção quando sai do intervalo
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = vol[a] - erro / (gregas["vega"] / 100)
+        fora = ~np.isfinite(newton) | (newton <= vol_esq[a]) | (newton >= vol_dir[a])
+        nova_vol = np.where(fora, (vol_esq[a] + vol_dir[a]) / 2, newton)
+
+        fim = (erro == 0) | (np.abs(nova_vol - vol[a]) < tol * np.maximum(nova_vol, 1)) | ((vol_dir[a] - vol_esq[a]) < tol)
+        vol[a] = np.where(erro == 0, vol[a], nova_vol)
+        iteracoes[a] += 1
+        convergiu[a[fim]] = True
+        ativos = a[~fim]
+
+    return {
+        "vol": np.where(convergiu, vol, np.nan).reshape(forma),
+        "convergiu": convergiu.reshape(forma),
+        "iteracoes": iteracoes.reshape(forma)
+    }
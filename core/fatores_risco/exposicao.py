@@ -1,10 +1,12 @@
 from datetime import date
+from math import isfinite
 
 from pandas import DataFrame, concat, to_datetime
 
 from core.carteira import Carteira, Posicao
-from core.fatores_risco.black_scholes import bs_delta, bs_implied_vol, bs_price, bs_vega
 from core.fatores_risco.fatores_risco import nomear_vetor_fator_risco
+from core.fatores_risco.opcoes import CacheAnaliticosOpcoes
+from core.renda_fixa.futuros_di import FuturosDI
 from core.renda_fixa.renda_fixa import RendaFixa
 from inputs.data_handler import InputsDataHandler
 from utils.enums import FatoresRisco, Opcoes, Localidade, Colunas, TipoFuturo, Futuros, AcoesUs, Titulos
@@ -16,10 +18,10 @@ class ExposicaoCarteira:
         self.inputs = inputs
 
     def exposicao_carteira(self) -> DataFrame:
-        # Calcular exposição de cada posição da carteira
+        # Calcular exposição de cada instrumento da carteira, já que a exposição é linear na quantidade
         exposicoes = [
             Exposicao(p, self.inputs, self.carteira.data_referencia).calcular_exposicao() 
-            for p in [p for p in self.carteira.__dict__.values() if isinstance(p, Posicao)]
+            for p in self.carteira.posicoes_agregadas()
         ]
 
         # Juntar exposições e formatar como vetor
@@ -30,6 +32,22 @@ class ExposicaoCarteira:
             .T
         )
 
+    def matriz_exposicao(self) -> DataFrame:
+        # Exposição de cada posição (posições × fatores), calculada por instrumento com quantidade unitária e escalada
+        exposicoes_unitarias = concat([
+            Exposicao(Posicao.de_instrumento(instrumento, 1.0), self.inputs, self.carteira.data_referencia)
+                .calcular_exposicao()
+                .groupby(Colunas.FATOR_RISCO.value)
+                .sum()
+                .T
+            for instrumento in self.carteira.instrumentos
+        ]).fillna(0)
+
+        return DataFrame(
+            self.carteira.quantidades[:, None] * exposicoes_unitarias.to_numpy(dtype=float)[self.carteira.codigos],
+            columns=exposicoes_unitarias.columns.to_list()
+        )
+
 
 class Exposicao:
     def __init__(self, posicao: Posicao, inputs: InputsDataHandler, data_referencia: date):
@@ -40,21 +58,13 @@ class Exposicao:
     def calcular_exposicao(self) -> DataFrame:
         exposicoes_fatores_risco = []
         if isinstance(self.posicao.ativo, Opcoes):
-            # Recuperar informações de opções
-            opcoes = self.inputs.opcoes()
-            opcoes = opcoes.loc[opcoes[Colunas.ID.value] == self.posicao.ativo.value]
-
-            # Definir características da opção
-            S = float(opcoes["strike"].values[0])
-            K = float(opcoes["nocional"].values[0])
-            T = RendaFixa.calcular_du(self.data_referencia, to_datetime(opcoes["vencimento"].values[0]), self.inputs)/252
-            preco_opcao = float(opcoes["preco"].values[0])
-            tipo = 1 if opcoes["tipo"].values[0] == "call" else -1
-
-            # Calcular propriedades Black-Scholes
-            vol_implicita = float(bs_implied_vol(S, K, T, 0, 0, preco_opcao, tipo, 1))
-            delta = float(bs_delta(S, K, T, 0, 0, vol_implicita, tipo, 1))
-            vega = float(bs_vega(S, K, T, 0, 0, vol_implicita, tipo, 1))
+            # Recuperar prazo, volatilidade implícita e gregas da opção na data de referência
+            opcao = CacheAnaliticosOpcoes.compartilhado().obter(self.posicao.instrumento, self.data_referencia, self.inputs)
+            S = opcao.S
+            delta = opcao.delta
+            vega = opcao.vega
+            if not (isfinite(delta) and isfinite(vega)):
+                raise ValueError(f"Gregas indisponíveis para a opção {self.posicao.ativo.name}.")
 
             # Determinar exposições por parte do efeito do preço da ação e da volatilidade
             w1_s = self._exposicao_acao(self.posicao.quantidade, S, delta)
@@ -76,8 +86,7 @@ class Exposicao:
         # Calcular exposição para futuros
         #TODO: Futuramente expandir regra para comportar títulos NTN-B e NTN-F
         if isinstance(self.posicao.ativo, Futuros) and self.posicao.produto not in [TipoFuturo.DI]:
-            df_futuros = self.inputs.futuros()
-            contratos = float(df_futuros.loc[df_futuros[Colunas.ID.value] == self.posicao.ativo.value]["tamanho_contrato"].values[0])
+            contratos = float(self.posicao.instrumento.tamanho_contrato)
             if not ((FatoresRisco.CAMBIO_USDBRL in self.posicao.fatores_risco) or (FatoresRisco.CAMBIO_USDOUTROS in self.posicao.fatores_risco)):
                 w = self._exposicao_futuros(self.posicao.quantidade, contratos)
 
@@ -90,22 +99,16 @@ class Exposicao:
                     continue
 
                 # Fazer distinção entre ações brasileiras e americanas
-                elif self.posicao.localidade == Localidade.BR:
-                    precos = self.inputs.acoes_br()
+                mercado = self.inputs.mercado()
+                if self.posicao.localidade == Localidade.BR:
+                    precos = mercado.acoes_br
                     cambio = 1.0
                 elif self.posicao.localidade == Localidade.US:
-                    precos = self.inputs.acoes_br()
-                    df_cambio = self.inputs.fx()
-                    cambio = float(df_cambio.loc[
-                        (df_cambio[Colunas.DATA.value] == df_cambio[Colunas.DATA.value].max()) &
-                        (df_cambio[Colunas.CAMBIO.value] == TipoFuturo.USDBRL.name)
-                    ][Colunas.VALOR.value].values[0])
+                    precos = mercado.acoes_us
+                    cambio = mercado.fx.ultimo(TipoFuturo.USDBRL.name)
+
                 # Buscar último preco da ação
-                precos = self.inputs.acoes_br() if self.posicao.localidade == Localidade.BR else self.inputs.acoes_us()
-                ultimo_preco = float(precos.loc[
-                    (precos[Colunas.ATIVO.value] == self.posicao.ativo.value) &
-                    (precos[Colunas.DATA.value] == precos[Colunas.DATA.value].max())
-                ][Colunas.PRECO.value].values[0])
+                ultimo_preco = precos.ultimo(self.posicao.ativo.value)
 
                 # Calcular exposição e adicionar ao vetor de exposições
                 w = float(self._exposicao_acao(self.posicao.quantidade, ultimo_preco, cambio=cambio))
@@ -122,25 +125,11 @@ class Exposicao:
                 if fr == FatoresRisco.CAMBIO_USDBRL and len(self.posicao.fatores_risco) > 1:
                    continue
 
-                df_cambio = self.inputs.fx()
-                
-                filtro = TipoFuturo.USDBRL.name if fr == FatoresRisco.CAMBIO_USDBRL else self.posicao.produto.name
-                cambio_dolar = float(df_cambio.loc[
-                    (df_cambio[Colunas.CAMBIO.value] == TipoFuturo.USDBRL.name) &
-                    (df_cambio[Colunas.DATA.value] == df_cambio[Colunas.DATA.value].max())
-                ][Colunas.VALOR.value].values[0])
-                
-                ultimo_cambio = (
-                    float(df_cambio.loc[
-                        (df_cambio[Colunas.CAMBIO.value] == filtro) &
-                        (df_cambio[Colunas.DATA.value] == df_cambio[Colunas.DATA.value].max())
-                    ][Colunas.VALOR.value].values[0])
-                    if fr == FatoresRisco.CAMBIO_USDOUTROS
-                    else
-                    1.0 
-                )
+                # Converter contrato para reais na última data, triangulando via dólar quando necessário
+                cambio = self.inputs.mercado().fx
+                reais_por_unidade = cambio.reais_por_unidade(self.posicao.instrumento.moeda, cambio.datas[-1])
 
-                w = float(self._exposicao_cambio(self.posicao.quantidade, contratos, cambio_dolar, ultimo_cambio))
+                w = float(self._exposicao_cambio(self.posicao.quantidade, contratos, reais_por_unidade))
                 w_df = self._criar_df_exposicao(nomear_vetor_fator_risco(fr, self.posicao), w)
                 exposicoes_fatores_risco.append(w_df)
 
@@ -152,20 +141,8 @@ class Exposicao:
             elif fr == FatoresRisco.JUROS:
                 # Se for proveniente de futuros, apenas utilizar exposição calculada para esse tipo de ativo
                 if isinstance(self.posicao.ativo, Futuros):
-                    # Utilizar framework de cálculo de renda fixa para extrair informações da curva DI
-                    rf1 = RendaFixa(
-                        self.data_referencia,
-                        self.posicao.vencimento,
-                        self.posicao.localidade,
-                        self.inputs
-                    )
-
-                    # Extrair taxa do dia de referência
-                    curva_di = rf1.curva_juros()
-                    data_ref = curva_di.loc[curva_di[Colunas.DATA.value] <= self.data_referencia][Colunas.DATA.value].max()
-                    taxa_di = float(curva_di.loc[
-                        curva_di[Colunas.DATA.value] == data_ref 
-                    ][Colunas.VALOR.value].values[0])
+                    # Extrair taxa do dia de referência da curva DI já interpolada no prazo do contrato
+                    taxa_di = float(FuturosDI(self.posicao.vencimento, self.data_referencia, self.inputs).taxas_referencia()[0])
 
                     # Calcular duration modificada e PU
                     rf2 = RendaFixa(
@@ -190,9 +167,8 @@ class Exposicao:
                     continue
 
                 # Instanciar calculadora de renda fixa
-                df_titulos = self.inputs.titulos()
-                cupom = float(df_titulos.loc[df_titulos[Colunas.ID.value] == self.posicao.ativo.value]["cupom"].values[0])
-                taxa = float(df_titulos.loc[df_titulos[Colunas.ID.value] == self.posicao.ativo.value]["taxa"].values[0])
+                cupom = float(self.posicao.instrumento.cupom)
+                taxa = float(self.posicao.instrumento.taxa)
                 rf = RendaFixa(
                     self.data_referencia,
                     self.posicao.vencimento,
@@ -207,12 +183,8 @@ class Exposicao:
                 duration_modificada = rf.duration_modificada()
 
                 # Calcular exposição
-                df_cambio = self.inputs.fx()
                 cambio_dolar = (
-                    float(df_cambio.loc[
-                        (df_cambio[Colunas.CAMBIO.value] == TipoFuturo.USDBRL.name) &
-                        (df_cambio[Colunas.DATA.value] == df_cambio[Colunas.DATA.value].max())
-                    ][Colunas.VALOR.value].values[0])
+                    self.inputs.mercado().fx.ultimo(TipoFuturo.USDBRL.name)
                     if self.posicao.localidade == Localidade.US
                     else
                     1.0 
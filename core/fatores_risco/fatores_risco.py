@@ -1,17 +1,20 @@
+import json
 from datetime import date
 from typing import Optional
 
-from arch import arch_model
-from numpy import array, diag, sqrt
-from pandas import DataFrame, Series, concat
+from numpy import allclose, arange, array, atleast_2d, cov, diag, empty, full, isnan, ix_, nan, ndarray, outer, sqrt, where, zeros
+from pandas import DataFrame, Series, concat, factorize, to_datetime
 
 from core.carteira import Carteira, Posicao
+from core.fatores_risco.garch import EstimadorGarch
 from core.renda_fixa.renda_fixa import RendaFixa
 from inputs.data_handler import InputsDataHandler
 from utils.enums import Colunas, FatoresRisco, Localidade, TipoFuturo, Futuros, Opcoes, AcoesBr, AcoesUs
 
 
 class MatrizFatoresRisco:
+    _GARCH = EstimadorGarch()
+
     def __init__(
             self, 
             carteira: Carteira, 
@@ -23,8 +26,8 @@ class MatrizFatoresRisco:
         self.lambda_ = lambda_
 
     def fatores_risco_carteira(self) -> DataFrame:
-        # Extrair posições
-        posicoes: list[Posicao] = [p for p in self.carteira.__dict__.values() if isinstance(p, Posicao)]
+        # Extrair instrumentos distintos da carteira, pois os fatores de risco não dependem da quantidade
+        posicoes: list[Posicao] = self.carteira.posicoes_agregadas()
 
         # Iterar posições para extrair dados sobre cada um dos fatores de risco
         lista_fatores_risco = []
@@ -70,28 +73,29 @@ class MatrizFatoresRisco:
             values=Colunas.VALOR.value
         ).dropna()
     
-    def matriz_cov_ewma(self, lambda_: float = 0.94):
-        # Inicializa com a covariância amostral
+    def matriz_cov_ewma(self, lambda_: float = 0.94) -> DataFrame:
+        # Inicializa com a covariância amostral e acumula os produtos externos dos retornos em um único produto ponderado
         retornos = self.fatores_risco_carteira()
-        cov_ewma = retornos.cov()
-        for i in range(1, len(retornos)):
-            r_t = retornos.iloc[i].values.reshape(-1, 1)
-            cov_ewma = lambda_ * cov_ewma + (1 - lambda_) * (r_t @ r_t.T)
+        cov_ewma = CalculosFatoresRisco.cov_ewma(retornos.to_numpy(dtype=float), lambda_)
         return DataFrame(cov_ewma, index=retornos.columns, columns=retornos.columns)
 
-    def matriz_cov_garch(self) -> DataFrame:
-        df_retornos = self.fatores_risco_carteira()
-        modelos_garch = {}
-        volatilidades = {}
+    def trajetoria_cov_ewma(self, lambda_: float = 0.94) -> "TrajetoriaCovariancia":
+        # Guardar a matriz de covariância de cada data, para consultas posteriores sem recálculo
+        retornos = self.fatores_risco_carteira()
+        return TrajetoriaCovariancia(
+            CalculosFatoresRisco.trajetoria_cov_ewma(retornos.to_numpy(dtype=float), lambda_),
+            retornos.index.to_numpy(dtype="datetime64[ns]"),
+            retornos.columns.to_list()
+        )
 
-        for coluna in df_retornos.columns:
-            serie = df_retornos[coluna].dropna()
-            modelo = arch_model(serie, vol='Garch', p=1, q=1)
-            resultado = modelo.fit(disp="off")
-            modelos_garch[coluna] = resultado
+    def estado_cov_ewma(self, lambda_: float = 0.94) -> "EstadoCovEwma":
+        # Estado inicial para atualizações diárias da covariância, sem reprocessar o histórico
+        return EstadoCovEwma.de_retornos(self.fatores_risco_carteira(), lambda_)
 
-            # Extrai volatilidade condicional estimada
-            volatilidades[coluna] = resultado.conditional_volatility
+    def matriz_cov_garch(self, reestimar: bool = True) -> DataFrame:
+        # Estimar (ou apenas filtrar, com parâmetros em cache) volatilidade condicional de cada fator
+        df_retornos = self.fatores_risco_carteira()
+        volatilidades = self._GARCH.volatilidades(df_retornos, reestimar)
 
         # Usar correlação empírica entre retornos (últimos N dias)
         corr_matrix = df_retornos.corr()
@@ -110,6 +114,110 @@ class MatrizFatoresRisco:
         return DataFrame(cov_garch, index=df_retornos.columns, columns=df_retornos.columns)
 
 
+class TrajetoriaCovariancia:
+    """
+    Matrizes de covariância EWMA (datas × fatores × fatores), com retornos até cada data, inclusive.
+    """
+    def __init__(self, matrizes: ndarray, datas: ndarray, fatores: list[str]):
+        assert matrizes.shape == (len(datas), len(fatores), len(fatores)), "Dimensões da trajetória incompatíveis com datas e fatores."
+        self.matrizes = matrizes
+        self.datas = datas
+        self.fatores = fatores
+
+    def __len__(self) -> int:
+        return len(self.datas)
+
+    def matriz(self, data: date) -> DataFrame:
+        # Última matriz disponível até a data consultada
+        i = int(self.datas.searchsorted(to_datetime(data).to_datetime64(), side="right")) - 1
+        assert i >= 0, "Data anterior ao início da trajetória de covariâncias."
+        return DataFrame(self.matrizes[i], index=self.fatores, columns=self.fatores)
+
+
+class EstadoCovEwma:
+    """
+    Estado da covariância EWMA para atualização incremental em O(K²) por dia, gravável em disco.
+    """
+    def __init__(self, matriz: ndarray, fatores: list[str], data: date, lambda_: float = 0.94):
+        assert lambda_ >= 0 and lambda_ <= 1, "Parâmetro lambda fora do domínio (entre 0 e 1)."
+        assert matriz.shape == (len(fatores), len(fatores)), "Dimensões da matriz incompatíveis com os fatores."
+        self.matriz = array(matriz, dtype=float)
+        self.fatores = list(fatores)
+        self.data = to_datetime(data)
+        self.lambda_ = lambda_
+
+    @classmethod
+    def de_retornos(cls, retornos: DataFrame, lambda_: float = 0.94) -> "EstadoCovEwma":
+        retornos = retornos.sort_index()
+        return cls(
+            CalculosFatoresRisco.cov_ewma(retornos.to_numpy(dtype=float), lambda_),
+            retornos.columns.to_list(),
+            retornos.index.max(),
+            lambda_
+        )
+
+    def matriz_cov(self) -> DataFrame:
+        return DataFrame(self.matriz, index=self.fatores, columns=self.fatores)
+
+    def atualizar(self, retornos_dia: Series, data: Optional[date] = None) -> "EstadoCovEwma":
+        # Data da observação: por padrão, o nome da linha extraída do DataFrame de retornos
+        data = to_datetime(retornos_dia.name if data is None else data)
+        assert data > self.data, "Retornos devem ser posteriores à última data incorporada ao estado."
+
+        desconhecidos = [f for f in retornos_dia.index if f not in self.fatores]
+        assert not desconhecidos, f"Fatores fora do estado: {desconhecidos}. Utilize adicionar_fatores antes da atualização."
+        r_t = retornos_dia.reindex(self.fatores).to_numpy(dtype=float)
+        assert not isnan(r_t).any(), "Retornos ausentes para fatores do estado."
+
+        self.matriz = self.lambda_ * self.matriz + (1 - self.lambda_) * outer(r_t, r_t)
+        self.data = data
+        return self
+
+    def atualizar_retornos(self, retornos: DataFrame) -> "EstadoCovEwma":
+        # Incorporar, em ordem cronológica, apenas as datas posteriores ao estado
+        retornos = retornos.sort_index()
+        for data, retornos_dia in retornos.loc[retornos.index > self.data].iterrows():
+            self.atualizar(retornos_dia, data)
+        return self
+
+    def adicionar_fatores(self, historico: DataFrame) -> "EstadoCovEwma":
+        # Incluir novos fatores a partir de um histórico até a data do estado, preservando o bloco dos fatores atuais
+        ausentes = [f for f in self.fatores if f not in historico.columns]
+        assert not ausentes, f"Histórico não contém os fatores atuais do estado: {ausentes}."
+        historico = historico.sort_index().loc[historico.index <= self.data]
+        assert len(historico) and historico.index.max() == self.data, "Histórico deve terminar na data do estado."
+
+        novos = [f for f in historico.columns if f not in self.fatores]
+        fatores = self.fatores + novos
+        matriz = CalculosFatoresRisco.cov_ewma(historico[fatores].to_numpy(dtype=float), self.lambda_)
+        matriz[:len(self.fatores), :len(self.fatores)] = self.matriz
+
+        self.matriz = matriz
+        self.fatores = fatores
+        return self
+
+    def remover_fatores(self, fatores: list[str]) -> "EstadoCovEwma":
+        manter = [i for i, f in enumerate(self.fatores) if f not in fatores]
+        self.matriz = self.matriz[ix_(manter, manter)]
+        self.fatores = [self.fatores[i] for i in manter]
+        return self
+
+    def salvar(self, caminho: str) -> None:
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            json.dump({
+                "lambda": self.lambda_,
+                "data": self.data.isoformat(),
+                "fatores": self.fatores,
+                "matriz": self.matriz.tolist()
+            }, arquivo, ensure_ascii=False)
+
+    @classmethod
+    def carregar(cls, caminho: str) -> "EstadoCovEwma":
+        with open(caminho, encoding="utf-8") as arquivo:
+            estado = json.load(arquivo)
+        return cls(array(estado["matriz"], dtype=float), estado["fatores"], estado["data"], estado["lambda"])
+
+
 class CalculosFatoresRisco:
     @classmethod
     def calcular_variacao(
@@ -168,11 +276,91 @@ class CalculosFatoresRisco:
     def ewma_unitario(cls, valor_calculado: float, valor_fator_risco: float, lambda_: float = 0.94) -> float:
         return lambda_ * valor_calculado + (1 - lambda_) * valor_fator_risco
 
+    @classmethod
+    def pesos_cov_ewma(cls, n_observacoes: int, lambda_: float = 0.94) -> ndarray:
+        # Peso de cada observação na covariância final; a primeira entra apenas pela covariância amostral inicial
+        pesos = (1 - lambda_) * pow(lambda_, arange(n_observacoes - 1, -1, -1, dtype=float))
+        pesos[:1] = 0.0
+        return pesos
+
+    @classmethod
+    def cov_ewma(cls, retornos: ndarray, lambda_: float = 0.94) -> ndarray:
+        # Covariância EWMA final dos retornos (datas × fatores), como λ^(T-1)·Σ_0 + Rᵀ·diag(w)·R
+        assert lambda_ >= 0 and lambda_ <= 1, "Parâmetro lambda fora do domínio (entre 0 e 1)."
+        semente = atleast_2d(cov(retornos, rowvar=False))
+        pesos = cls.pesos_cov_ewma(len(retornos), lambda_)
+        return pow(lambda_, len(retornos) - 1) * semente + (retornos.T * pesos) @ retornos
+
+    @classmethod
+    def trajetoria_cov_ewma(cls, retornos: ndarray, lambda_: float = 0.94) -> ndarray:
+        # Matriz de covariância EWMA de cada data (datas × fatores × fatores)
+        assert lambda_ >= 0 and lambda_ <= 1, "Parâmetro lambda fora do domínio (entre 0 e 1)."
+        trajetoria = empty((len(retornos), retornos.shape[1], retornos.shape[1]), dtype=float)
+        trajetoria[0] = atleast_2d(cov(retornos, rowvar=False))
+        for t in range(1, len(retornos)):
+            trajetoria[t] = lambda_ * trajetoria[t - 1] + (1 - lambda_) * outer(retornos[t], retornos[t])
+        return trajetoria
+
+    @classmethod
+    def ewma_matricial(cls, valores: ndarray, lambda_: float = 0.94) -> ndarray:
+        # Recursão EWMA em todas as colunas (observações × séries), com estado inicial zero e NaN anterior tratado como zero
+        resultado = empty(valores.shape, dtype=float)
+        anterior = zeros(valores.shape[1:], dtype=float)
+        for t in range(valores.shape[0]):
+            resultado[t] = lambda_ * anterior + (1 - lambda_) * valores[t]
+            anterior = where(isnan(resultado[t]), 0.0, resultado[t])
+
+        return resultado
+
     @classmethod
     def variancia_ewma(cls, df: DataFrame, agrupar_por: Colunas, lambda_: float = 0.94, eh_serie_unica: bool = False) -> DataFrame:
         # Validar valor do lambda
         assert lambda_ >= 0 and lambda_ <= 1, "Parâmetro lambda fora do domínio (entre 0 e 1)."
 
+        # Ordenar observações de cada série por data
+        df = df.sort_values([Colunas.ATIVO.value, Colunas.DATA.value]).reset_index(drop=True)
+
+        # Dispor quadrados das variações em formato largo (n-ésima observação × série); séries mais curtas
+        # ficam completadas com NaN ao final, sem afetar a recursão das demais. O parâmetro `eh_serie_unica`
+        # não altera o cálculo e é mantido apenas por compatibilidade.
+        series, _ = factorize(df[agrupar_por.value])
+        observacao = df.groupby(agrupar_por.value, sort=False).cumcount().to_numpy()
+        quadrados = full((observacao.max(initial=-1) + 1, series.max(initial=-1) + 1), nan)
+        quadrados[observacao, series] = pow(df[Colunas.VARIACAO.value].to_numpy(dtype=float), 2)
+
+        # Efetuar cálculo de variância seguindo modelo EWMA para todas as séries simultaneamente
+        df[Colunas.VARIANCIA_EWMA.value] = cls.ewma_matricial(quadrados, lambda_)[observacao, series]
+
+        return df
+
+    @classmethod
+    def verificar_variancia_ewma(
+        cls,
+        df: DataFrame,
+        agrupar_por: Colunas,
+        lambda_: float = 0.94,
+        eh_serie_unica: bool = False,
+        tolerancia: float = 1e-12
+    ) -> bool:
+        """
+        Compara a variância EWMA vetorizada com a implementação iterativa original, data a data.
+        """
+        vetorizada = cls.variancia_ewma(df.copy(), agrupar_por, lambda_, eh_serie_unica)
+        iterativa = cls._variancia_ewma_iterativa(df.copy(), agrupar_por, lambda_, eh_serie_unica)
+
+        return bool(allclose(
+            vetorizada[Colunas.VARIANCIA_EWMA.value].to_numpy(dtype=float),
+            iterativa[Colunas.VARIANCIA_EWMA.value].to_numpy(dtype=float),
+            rtol=tolerancia,
+            atol=0.0,
+            equal_nan=True
+        ))
+
+    @classmethod
+    def _variancia_ewma_iterativa(cls, df: DataFrame, agrupar_por: Colunas, lambda_: float = 0.94, eh_serie_unica: bool = False) -> DataFrame:
+        # Validar valor do lambda
+        assert lambda_ >= 0 and lambda_ <= 1, "Parâmetro lambda fora do domínio (entre 0 e 1)."
+
         # Iniciar modelo
         df[Colunas.VARIANCIA_EWMA.value] = 0.0
         df = df.sort_values([Colunas.ATIVO.value, Colunas.DATA.value]).reset_index(drop=True)
@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from typing import Optional
+
+from arch import arch_model
+from numpy import ndarray
+from pandas import DataFrame, Series
+from pandas.util import hash_pandas_object
+
+
+class EstimadorGarch:
+    """
+    Estimação de GARCH(1,1) por fator de risco, com cache de parâmetros por (fator, versão dos dados).
+    """
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._parametros: dict[tuple[str, str], ndarray] = {}
+        self._ultimos: dict[str, ndarray] = {}
+
+    @staticmethod
+    def versao(serie: Series) -> str:
+        return sha256(hash_pandas_object(serie).to_numpy().tobytes()).hexdigest()
+
+    def volatilidades(self, retornos: DataFrame, reestimar: bool = True) -> dict[str, Series]:
+        # Volatilidade condicional de cada coluna; sem reestimar, fatores já estimados são apenas filtrados
+        series = {coluna: retornos[coluna].dropna() for coluna in retornos.columns}
+        versoes = {coluna: self.versao(serie) for coluna, serie in series.items()}
+
+        # Estimar apenas fatores sem parâmetros para a versão atual dos dados
+        pendentes = [
+            coluna for coluna in series
+            if (coluna, versoes[coluna]) not in self._parametros and (reestimar or coluna not in self._ultimos)
+        ]
+        for coluna, parametros in self._estimar({coluna: series[coluna] for coluna in pendentes}).items():
+            self._parametros[(coluna, versoes[coluna])] = parametros
+            self._ultimos[coluna] = parametros
+
+        # Filtrar séries com parâmetros fixos para obter a volatilidade condicional
+        return {
+            coluna: arch_model(serie, vol="Garch", p=1, q=1).fix(
+                self._parametros.get((coluna, versoes[coluna]), self._ultimos[coluna])
+            ).conditional_volatility
+            for coluna, serie in series.items()
+        }
+
+    def parametros(self, fator: str) -> Optional[ndarray]:
+        # Últimos parâmetros estimados para o fator (mu, omega, alpha, beta)
+        return self._ultimos.get(fator)
+
+    def limpar(self) -> None:
+        self._parametros.clear()
+        self._ultimos.clear()
+
+    def _estimar(self, series: dict[str, Series]) -> dict[str, ndarray]:
+        # Partir dos últimos parâmetros do fator, quando existirem
+        iniciais = [self._ultimos.get(coluna) for coluna in series]
+
+        n_workers = min(self.max_workers, len(series))
+        if n_workers <= 1:
+            resultados = list(map(_ajustar_garch, series.values(), iniciais))
+        else:
+            with ProcessPoolExecutor(n_workers) as executor:
+                resultados = list(executor.map(_ajustar_garch, series.values(), iniciais))
+
+        return dict(zip(series, resultados))
+
+
+def _ajustar_garch(serie: Series, parametros_iniciais: Optional[ndarray]) -> ndarray:
+    modelo = arch_model(serie, vol="Garch", p=1, q=1)
+    return modelo.fit(disp="off", starting_values=parametros_iniciais).params.to_numpy()
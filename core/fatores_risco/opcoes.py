@@ -0,0 +1,156 @@
+import warnings
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+
+from numpy import array, where
+from pandas import Timestamp, to_datetime
+
+from core.fatores_risco.black_scholes import bs_gregas, bs_implied_vol_lote
+from inputs.data_handler import InputsDataHandler
+from inputs.instrumentos import Instrumento
+from utils.enums import Opcoes
+
+
+class AnaliticoOpcao:
+    """
+    Características de uma opção em uma data de referência: prazo, volatilidade implícita e gregas.
+    """
+    def __init__(
+            self,
+            ativo: Opcoes,
+            data_referencia: Timestamp,
+            S: float,
+            K: float,
+            T: float,
+            preco: float,
+            tipo: int,
+            vol_implicita: float,
+            delta: float,
+            gamma: float,
+            vega: float,
+            theta: float,
+            convergiu: bool = True
+    ):
+        self.ativo = ativo
+        self.data_referencia = data_referencia
+        self.S = S
+        self.K = K
+        self.T = T
+        self.preco = preco
+        self.tipo = tipo
+        self.vol_implicita = vol_implicita
+        self.delta = delta
+        self.gamma = gamma
+        self.vega = vega
+        self.theta = theta
+        self.convergiu = convergiu
+
+
+class CacheAnaliticosOpcoes:
+    """
+    Cache LRU de analíticos de opções por (opção, data de referência, versão dos dados de mercado).
+    """
+    _COMPARTILHADO: Optional["CacheAnaliticosOpcoes"] = None
+    VOL_MINIMA = 1e-3
+    VOL_MAXIMA = 1000
+
+    def __init__(self, tamanho_maximo: int = 1024):
+        assert tamanho_maximo > 0, "Tamanho máximo do cache deve ser positivo."
+        self.tamanho_maximo = tamanho_maximo
+        self._analiticos: OrderedDict = OrderedDict()
+        self.acertos = 0
+        self.falhas = 0
+
+    @classmethod
+    def compartilhado(cls) -> "CacheAnaliticosOpcoes":
+        # Instância única do processo
+        if cls._COMPARTILHADO is None:
+            cls._COMPARTILHADO = cls()
+        return cls._COMPARTILHADO
+
+    def obter(self, opcao: Instrumento, data_referencia: date, inputs: InputsDataHandler) -> AnaliticoOpcao:
+        chave = self._chave(opcao.ativo, data_referencia, inputs)
+        if chave in self._analiticos:
+            self.acertos += 1
+            self._analiticos.move_to_end(chave)
+            return self._analiticos[chave]
+
+        self.falhas += 1
+        return self._calcular([opcao], data_referencia, inputs)[0]
+
+    def preaquecer(self, data_referencia: date, inputs: InputsDataHandler) -> list[AnaliticoOpcao]:
+        # Calcular, em um único lote, todas as opções da aba "Dados Carteiras"
+        return self._calcular(inputs.instrumentos().listar(Opcoes), data_referencia, inputs)
+
+    def estatisticas(self) -> dict:
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "opcoes": len(self._analiticos)
+        }
+
+    def limpar(self) -> None:
+        self._analiticos.clear()
+        self.acertos = 0
+        self.falhas = 0
+
+    @staticmethod
+    def _chave(ativo: Opcoes, data_referencia: date, inputs: InputsDataHandler) -> tuple:
+        return ativo, to_datetime(data_referencia).normalize(), inputs.versao()
+
+    def _calcular(self, opcoes: list[Instrumento], data_referencia: date, inputs: InputsDataHandler) -> list[AnaliticoOpcao]:
+        data_referencia = to_datetime(data_referencia)
+
+        # Definir características das opções (o strike da planilha é utilizado como preço do ativo objeto
+        # e o nocional como strike, como no restante do código)
+        S = array([float(o.strike) for o in opcoes])
+        K = array([float(o.nocional) for o in opcoes])
+        T = inputs.calendario().du(data_referencia, array([to_datetime(o.vencimento) for o in opcoes], dtype="datetime64[ns]"))/252
+        precos = array([float(o.preco) for o in opcoes])
+        tipos = array([1 if o.tipo_opcao == "call" else -1 for o in opcoes])
+
+        # Calcular volatilidades implícitas e gregas de todas as opções de uma vez
+        resultado = bs_implied_vol_lote(S, K, T, 0, 0, precos, tipos, 1, vol_min=self.VOL_MINIMA, vol_max=self.VOL_MAXIMA)
+        convergiu = resultado["convergiu"]
+
+        # Sem volatilidade que reproduza o preço (ex.: prêmio abaixo do valor intrínseco), utilizar o limite do
+        # intervalo de busca do lado do preço, de forma que as gregas tendem às do valor intrínseco (delta ±1 dentro
+        # do dinheiro) ao invés de NaN
+        limite_inferior = bs_gregas(S, K, T, 0, 0, self.VOL_MINIMA, tipos, 1)["preco"]
+        vols = where(convergiu, resultado["vol"], where(precos <= limite_inferior, self.VOL_MINIMA, self.VOL_MAXIMA))
+        gregas = bs_gregas(S, K, T, 0, 0, vols, tipos, 1)
+        if not convergiu.all():
+            warnings.warn(
+                "Volatilidade implícita sem convergência, utilizando limite do intervalo de busca: "
+                + ", ".join(o.ativo.name for o, c in zip(opcoes, convergiu) if not c)
+            )
+
+        analiticos = []
+        for i, opcao in enumerate(opcoes):
+            analitico = AnaliticoOpcao(
+                opcao.ativo,
+                data_referencia,
+                S[i],
+                K[i],
+                T[i],
+                precos[i],
+                int(tipos[i]),
+                float(vols[i]),
+                float(gregas["delta"][i]),
+                float(gregas["gamma"][i]),
+                float(gregas["vega"][i]),
+                float(gregas["theta"][i]),
+                bool(convergiu[i])
+            )
+            self._guardar(self._chave(opcao.ativo, data_referencia, inputs), analitico)
+            analiticos.append(analitico)
+
+        return analiticos
+
+    def _guardar(self, chave: tuple, analitico: AnaliticoOpcao) -> None:
+        # Descartar a opção usada há mais tempo quando o limite for atingido
+        self._analiticos[chave] = analitico
+        self._analiticos.move_to_end(chave)
+        while len(self._analiticos) > self.tamanho_maximo:
+            self._analiticos.popitem(last=False)
@@ -0,0 +1,88 @@
+from datetime import date
+from typing import Optional, Union
+
+from numpy import arange, array, asarray, atleast_1d, full, isnan, maximum, nan, ndarray, where
+from pandas import to_datetime
+
+from inputs.data_handler import InputsDataHandler
+
+
+class FuturosDI:
+    """
+    Precificação vetorizada de futuros de DI, com PU = valor de face / (1 + r)^(du/252).
+    """
+    VALOR_FACE = 100000
+
+    def __init__(
+            self,
+            vencimentos: Union[date, list[date], ndarray],
+            data_referencia: date,
+            inputs: InputsDataHandler,
+            valor_face: Union[float, list[float], ndarray] = VALOR_FACE
+    ):
+        self.data_referencia = to_datetime(data_referencia)
+        self.vencimentos = atleast_1d(asarray(to_datetime(vencimentos), dtype="datetime64[ns]"))
+        self.du = atleast_1d(inputs.calendario().du(self.data_referencia, self.vencimentos))
+        self.valor_face = atleast_1d(asarray(valor_face, dtype=float))
+
+        # Interpolar histórico de taxas no prazo de cada contrato
+        curva = inputs.mercado().di
+        self.datas = curva.datas
+        self.taxas = curva.interpolar(self.du)
+
+    @classmethod
+    def de_posicoes(cls, posicoes: list, data_referencia: date, inputs: InputsDataHandler) -> "FuturosDI":
+        return cls(
+            array([p.vencimento for p in posicoes], dtype="datetime64[ns]"),
+            data_referencia,
+            inputs,
+            array([float(p.instrumento.tamanho_contrato) for p in posicoes])
+        )
+
+    def __len__(self) -> int:
+        return len(self.du)
+
+    @staticmethod
+    def pu(taxas: Union[float, ndarray], du: Union[int, ndarray], valor_face: Union[float, ndarray] = VALOR_FACE) -> ndarray:
+        # Taxas em percentual ao ano, base 252 dias úteis
+        return valor_face / ((1 + asarray(taxas)/100) ** (asarray(du) / 252))
+
+    def taxas_referencia(self) -> ndarray:
+        # Última taxa disponível até a data de referência, para cada contrato
+        i = int(self.datas.searchsorted(self.data_referencia.to_datetime64(), side="right")) - 1
+        if i < 0:
+            return full(len(self), nan)
+
+        linhas = self._ultima_cotacao()[i]
+        return where(linhas >= 0, self.taxas[linhas.clip(0, None), arange(len(self))], nan)
+
+    def pu_referencia(self) -> ndarray:
+        return self.pu(self.taxas_referencia(), self.du, self.valor_face)
+
+    def variacoes(self) -> ndarray:
+        # Variação da taxa (datas × contratos) em relação à cotação anterior do próprio contrato
+        anterior = full(self.taxas.shape, -1)
+        anterior[1:] = self._ultima_cotacao()[:-1]
+
+        colunas = arange(len(self))
+        variacoes = self.taxas - self.taxas[anterior.clip(0, None), colunas]
+        return where(isnan(self.taxas) | (anterior < 0), nan, variacoes)
+
+    def cenarios_pu(self, datas: Optional[ndarray] = None) -> ndarray:
+        # PU (cenários × contratos) com a variação de taxa de cada data aplicada à taxa de referência; sem cotação, NaN
+        variacoes = self.variacoes()
+        if datas is not None:
+            datas = atleast_1d(asarray(to_datetime(datas), dtype="datetime64[ns]"))
+            i = self.datas.searchsorted(datas).clip(0, len(self.datas) - 1)
+            variacoes = where((self.datas[i] == datas)[:, None], variacoes[i], nan)
+
+        return self.pu(self.taxas_referencia() + variacoes, self.du, self.valor_face)
+
+    def cenarios_pnl(self, quantidades: Union[list[float], ndarray], datas: Optional[ndarray] = None) -> ndarray:
+        # PnL (cenários × contratos) por reavaliação completa do PU, positivo com alta de taxa (posição tomada em taxa)
+        return asarray(quantidades, dtype=float) * (self.pu_referencia() - self.cenarios_pu(datas))
+
+    def _ultima_cotacao(self) -> ndarray:
+        # Índice da última data com taxa disponível até cada data (-1 se inexistente), por contrato
+        indices = where(isnan(self.taxas), -1, arange(len(self.datas))[:, None])
+        return maximum.accumulate(indices, axis=0)
@@ -1,7 +1,8 @@
 from datetime import date
 from typing import Optional, Union
 
-from pandas import DataFrame, Timestamp, date_range, to_datetime
+from numpy import arange, asarray, atleast_1d, ndarray, zeros
+from pandas import DataFrame, Timestamp, to_datetime
 
 from inputs.data_handler import InputsDataHandler
 from utils.enums import Colunas, Localidade, TipoFuturo
@@ -38,50 +39,15 @@ class RendaFixa:
         
     @classmethod
     def calcular_du(cls, data_referencia: Timestamp, vencimento: Timestamp, inputs: InputsDataHandler) -> int:
-        # Carregar dados de feriados, filtrar datas e criar coluna de validação de feriado
-        feriados = inputs.feriados()
-        feriados = feriados.loc[
-            (feriados[Colunas.DATA.value] >= data_referencia) & 
-            (feriados[Colunas.DATA.value] <= vencimento)
-        ]
-
-        feriados = feriados.assign(eh_feriado=True)[[Colunas.DATA.value, "eh_feriado"]]
-
-        # Criar DataFrame com horizonte completo de dias da data de referência até o vencimento
-        dias_corridos = date_range(data_referencia, vencimento)
-
-        # Juntar filtrar feriados e finais de semana
-        feriados[Colunas.DATA.value] = to_datetime(feriados[Colunas.DATA.value])
-        dias_uteis = DataFrame(dias_corridos, columns=[Colunas.DATA.value])\
-                     .merge(feriados, on=[Colunas.DATA.value], how="left")\
-                     .assign(
-                        eh_feriado=lambda df: df["eh_feriado"].fillna(False).astype(bool),
-                        dia_semana=lambda df: df[Colunas.DATA.value].dt.day_of_week
-                     )
-        
-        dias_uteis = dias_uteis.loc[
-            (dias_uteis["eh_feriado"] == False) &
-            ~(dias_uteis["dia_semana"].isin([5, 6]))
-        ]
-
-        # Contar número de dias e desconsiderar o dia de referência
-        return dias_uteis.index.__len__() - 1
+        # Contar dias úteis no calendário construído a partir dos feriados, desconsiderando o dia de referência
+        return inputs.calendario().du(data_referencia, vencimento)
     
     def _definir_vertice_treasury(self) -> str:
         # Calcular diferença, em anos, entre a data de referência e o vencimento
         delta_anos = (self.vencimento - self.data_referencia).days / 365
 
-        # Carregar produtos Treasury
-        treasuries = self.inputs_data_handler.treasury()[Colunas.PRAZO.value].drop_duplicates().to_list()
-        treasuries = {
-            t: int(t.replace("Y", "")) 
-            if "Y" in t 
-            else int(t.replace("M", ""))/12
-            for t in treasuries 
-        }
-
         # Identificar produto cujo vértice é mais significativo
-        return min(treasuries, key=lambda k: abs(treasuries[k] - delta_anos))
+        return self.inputs_data_handler.mercado().treasury.vertice_mais_proximo(delta_anos)
 
     def curva_juros(self) -> DataFrame:
         if self.localidade == Localidade.US:
@@ -99,31 +65,12 @@ class RendaFixa:
 
         # Checar se existe algum produto com o mesmo du calculado e entregar curva específica, se houver
         du = self.periodo
-        if du in di[Colunas.PRAZO.value].drop_duplicates().to_list():
+        curva = self.inputs_data_handler.mercado().di
+        if du in curva.instrumentos:
             return di.loc[di[Colunas.PRAZO.value] == du]
         
         # Caso contrário, calcular curva interpolada
-        vertice_inferior = di[Colunas.PRAZO.value].drop_duplicates().loc[di[Colunas.PRAZO.value] < du].max()
-        vertice_superior = di[Colunas.PRAZO.value].drop_duplicates().loc[di[Colunas.PRAZO.value] > du].min()
-        fator_multiplicador = (du - vertice_inferior)/(vertice_superior - vertice_inferior)
-
-        interpol_df = (
-            di.loc[di[Colunas.PRAZO.value].isin([vertice_inferior, vertice_superior])]
-              .dropna()
-              .pivot(index=Colunas.DATA.value, columns=Colunas.PRAZO.value, values=Colunas.VALOR.value)
-        )
-        interpol_df[du] = interpol_df[vertice_inferior] + \
-                          fator_multiplicador * (interpol_df[vertice_superior] - interpol_df[vertice_inferior])
-        
-        return (
-            interpol_df.reset_index()
-                       .melt(
-                           id_vars=Colunas.DATA.value, 
-                           value_vars=du, 
-                           var_name=Colunas.PRAZO.value,
-                           value_name=Colunas.VALOR.value
-                       )
-        )
+        return curva.serie(du)
 
     def pu(self) -> float:
         if self.localidade == Localidade.BR:
@@ -167,6 +114,49 @@ class RendaFixa:
         else:
             raise ValueError("Localidade inválida.")
 
+    @classmethod
+    def fluxos_semestrais(
+            cls,
+            cupons: Union[float, list[float], ndarray],
+            total_periodos: Union[int, list[int], ndarray]
+    ) -> ndarray:
+        # Fluxos (períodos × títulos) por unidade de valor de face, nulos após o vencimento de cada título
+        cupons = atleast_1d(asarray(cupons, dtype=float)) / 100
+        total_periodos = atleast_1d(asarray(total_periodos, dtype=int))
+        assert (cupons > 0).all() and (cupons < 1).all(), "Cupom deve ser percentual maior que zero."
+        assert (total_periodos > 0).all(), "Total de períodos deve ser maior que zero."
+
+        periodos = arange(1, total_periodos.max() + 1)[:, None]
+        fluxos = zeros((len(periodos), len(cupons)))
+        fluxos += (periodos <= total_periodos) * cupons / 2 # Cupom é valor anual, então divide-se por dois
+        fluxos += (periodos == total_periodos)
+        return fluxos
+
+    @staticmethod
+    def fatores_desconto(taxas: ndarray, total_periodos: int) -> ndarray:
+        # Fatores de desconto (datas × períodos) para taxas semestrais de cada data
+        taxas = atleast_1d(asarray(taxas, dtype=float))
+        assert ((taxas > 0) & (taxas <= 1)).all(), "Taxa muito alta. Checar se valor inserido foi nominal ao invés de percentual."
+        return 1 / ((1 + taxas[:, None]) ** arange(1, total_periodos + 1))
+
+    @classmethod
+    def pu_fluxos(cls, fatores_desconto: ndarray, fluxos: ndarray, valor_face: Union[float, ndarray] = VALOR_FACE) -> ndarray:
+        # PU (datas × títulos) descontando todo o cronograma de fluxos de cada data em uma única operação
+        valor_face = asarray(valor_face, dtype=float)
+        valor_face = valor_face[:, None] if valor_face.ndim == 1 else valor_face
+        return valor_face * (fatores_desconto[:, :len(fluxos)] @ fluxos)
+
+    @classmethod
+    def sensibilidades_fluxos(cls, taxas: ndarray, fluxos: ndarray) -> tuple[ndarray, ndarray, ndarray]:
+        # PU e derivadas primeira e segunda (datas × títulos) na taxa semestral, por unidade de valor de face
+        taxas = atleast_1d(asarray(taxas, dtype=float))
+        periodos = arange(1, len(fluxos) + 1)
+        descontos = cls.fatores_desconto(taxas, len(fluxos))
+        pu = descontos @ fluxos
+        primeira = -((descontos * periodos) @ fluxos) / (1 + taxas[:, None])
+        segunda = ((descontos * periodos * (periodos + 1)) @ fluxos) / (1 + taxas[:, None]) ** 2
+        return pu, primeira, segunda
+
     @staticmethod
     def _vpl(valor_base: float, taxa: float, periodo: float) -> float:
         assert (taxa > 0) and (taxa <= 1), "Taxa muito alta. Checar se valor inserido foi nominal ao invés de percentual."
@@ -0,0 +1,122 @@
+from typing import Optional
+
+from numpy import abs as np_abs
+from numpy import arange, argsort, array, asarray, atleast_1d, concatenate, floor, full, isnan, nan, nanquantile, nansum, ndarray, \
+                  unique, where, zeros
+from pandas import DataFrame, Series
+
+from utils.enums import Colunas, IntervaloConfianca
+
+
+class CuboCenarios:
+    """
+    Cenários de PnL (cenários × posições), da data mais recente para a mais antiga; PnL ausente é NaN.
+    """
+    def __init__(self, pnl: ndarray, datas: ndarray, posicoes: ndarray, presente: Optional[ndarray] = None):
+        assert pnl.shape == (len(datas), len(posicoes)), "Dimensões do cubo incompatíveis com datas e posições."
+        self.pnl = pnl
+        self.datas = datas
+        self.posicoes = posicoes
+        self.presente = ~isnan(pnl) if presente is None else presente
+
+    @classmethod
+    def de_posicoes(
+            cls,
+            cenarios_posicoes: list[tuple[str, ndarray, ndarray]],
+            n_cenarios: Optional[int] = None
+    ) -> "CuboCenarios":
+        # Montar o cubo a partir de (posição, datas, PnL), mantendo as `n_cenarios` datas mais recentes
+        posicoes = array([posicao for posicao, _, _ in cenarios_posicoes], dtype=object)
+        todas_datas = [datas.astype("datetime64[ns]") for _, datas, _ in cenarios_posicoes]
+        datas = unique(concatenate(todas_datas) if todas_datas else array([], dtype="datetime64[ns]"))[::-1]
+        datas = datas[:n_cenarios]
+
+        # Posicionar PnL de cada posição na linha de sua data
+        pnl = full((len(datas), len(posicoes)), nan)
+        presente = zeros((len(datas), len(posicoes)), dtype=bool)
+        datas_crescentes = datas[::-1]
+        for j, (_, datas_posicao, pnl_posicao) in enumerate(cenarios_posicoes):
+            datas_posicao = datas_posicao.astype("datetime64[ns]")
+            indices = datas_crescentes.searchsorted(datas_posicao).clip(0, max(len(datas) - 1, 0))
+            validos = (datas_crescentes[indices] == datas_posicao) if len(datas) else zeros(len(datas_posicao), dtype=bool)
+            linhas = len(datas) - 1 - indices[validos]
+            pnl[linhas, j] = pnl_posicao[validos]
+            presente[linhas, j] = True
+
+        return cls(pnl, datas, posicoes, presente)
+
+    def __len__(self) -> int:
+        return len(self.datas)
+
+    def pnl_carteira(self) -> ndarray:
+        # PnL da carteira em cada cenário
+        return nansum(self.pnl, axis=1)
+
+    def serie_pnl_carteira(self) -> DataFrame:
+        # PnL da carteira por data, em ordem cronológica, no formato do agrupamento por data do formato longo
+        return DataFrame({
+            Colunas.DATA.value: self.datas[::-1],
+            Colunas.PNL.value: self.pnl_carteira()[::-1]
+        })
+
+    def var_posicoes(self, intervalo_confianca: IntervaloConfianca) -> Series:
+        # VaR histórico de cada posição isoladamente
+        return Series(
+            np_abs(nanquantile(self.pnl, self._percentil(intervalo_confianca), axis=0)),
+            index=self.posicoes,
+            name=Colunas.PNL.value
+        )
+
+    def var_componente(self, intervalo_confianca: IntervaloConfianca) -> Series:
+        # Contribuição de cada posição ao VaR da carteira, interpolada como o quantil; os componentes somam o VaR
+        pnl_carteira = self.pnl_carteira()
+        ordem = argsort(pnl_carteira, kind="stable")
+
+        # Cenários vizinhos ao quantil e peso do superior
+        indice = self._percentil(intervalo_confianca) * (len(ordem) - 1)
+        inferior = int(floor(indice))
+        superior = min(inferior + 1, len(ordem) - 1)
+        peso = indice - inferior
+
+        pnl = self.pnl.copy()
+        pnl[isnan(pnl)] = 0
+        componentes = (1 - peso) * pnl[ordem[inferior]] + peso * pnl[ordem[superior]]
+        quantil = (1 - peso) * pnl_carteira[ordem[inferior]] + peso * pnl_carteira[ordem[superior]]
+        return Series(
+            -componentes if quantil < 0 else componentes,
+            index=self.posicoes,
+            name=Colunas.PNL.value
+        )
+
+    def janelas_carteira(self, datas: ndarray, n_cenarios: int, escalas: Optional[ndarray] = None) -> ndarray:
+        # Janelas (datas × cenários) dos `n_cenarios` cenários anteriores a cada data, completadas com NaN no início;
+        # `escalas` (datas × posições) reescala o PnL de cada posição antes da soma
+        datas = atleast_1d(asarray(datas, dtype="datetime64[ns]"))
+        pnl = self.pnl[::-1].copy()
+        pnl[isnan(pnl)] = 0
+
+        # PnL da carteira de cada data avaliada em todos os cenários (datas × cenários)
+        pnl_carteira = pnl.sum(axis=1)[None, :] if escalas is None else escalas @ pnl.T
+
+        # Índices dos cenários de cada janela, terminando no último cenário anterior à data avaliada
+        fim = self.datas[::-1].searchsorted(datas, side="left")
+        indices = fim[:, None] + arange(-n_cenarios, 0)[None, :]
+        linhas = arange(len(datas))[:, None] if escalas is not None else zeros((len(datas), 1), dtype=int)
+        return where(indices >= 0, pnl_carteira[linhas, indices.clip(0, None)], nan)
+
+    def estresse(self) -> float:
+        # Maior perda da carteira entre os cenários
+        return abs(float(self.pnl_carteira().min()))
+
+    def para_dataframe(self) -> DataFrame:
+        # Converter para o formato longo (data, posição, PnL), ordenado da data mais recente para a mais antiga
+        linhas, colunas = self.presente.nonzero()
+        return DataFrame({
+            Colunas.DATA.value: self.datas[linhas],
+            Colunas.POSICAO.value: self.posicoes[colunas],
+            Colunas.PNL.value: self.pnl[linhas, colunas]
+        })
+
+    @staticmethod
+    def _percentil(intervalo_confianca: IntervaloConfianca) -> float:
+        return 1 - int(intervalo_confianca.name.split("P")[1])/100
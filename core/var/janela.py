@@ -0,0 +1,143 @@
+from math import floor, log10
+
+from numpy import arange, argsort, asarray, isnan, ndarray, zeros
+
+
+class _ArvoreFenwick:
+    """
+    Árvore de Fenwick (somas de prefixo) com atualização e busca em O(log n).
+    """
+    def __init__(self, tamanho: int):
+        self.tamanho = tamanho
+        self.arvore = zeros(tamanho + 1, dtype=float)
+        self._passo_inicial = 1 << max(tamanho.bit_length() - 1, 0)
+
+    def construir(self, valores: ndarray) -> None:
+        # Construção em O(n) a partir dos valores de cada posição
+        self.arvore[:] = 0
+        self.arvore[1:] = valores
+        for i in range(1, self.tamanho + 1):
+            pai = i + (i & -i)
+            if pai <= self.tamanho:
+                self.arvore[pai] += self.arvore[i]
+
+    def somar(self, posicao: int, valor: float) -> None:
+        i = posicao + 1
+        while i <= self.tamanho:
+            self.arvore[i] += valor
+            i += i & -i
+
+    def total(self) -> float:
+        total, i = 0.0, self.tamanho
+        while i > 0:
+            total += self.arvore[i]
+            i -= i & -i
+        return total
+
+    def buscar(self, alvo: float) -> int:
+        # Menor posição cuja soma de prefixo (inclusive) atinge o alvo
+        posicao, passo = 0, self._passo_inicial
+        while passo > 0:
+            proxima = posicao + passo
+            if proxima <= self.tamanho and self.arvore[proxima] < alvo:
+                posicao = proxima
+                alvo -= self.arvore[proxima]
+            passo >>= 1
+        return min(posicao, self.tamanho - 1)
+
+
+class JanelaOrdenada:
+    """
+    Janela móvel sobre um histórico de PnL, com contagens e pesos em ordem de valor para quantis em O(log n).
+    """
+    _ORDEM_MAXIMA_PESOS = 30
+
+    def __init__(self, historico: ndarray, n_cenarios: int, lambda_: float = 0.94):
+        assert n_cenarios > 0, "Janela deve conter ao menos um cenário."
+        assert lambda_ > 0 and lambda_ <= 1, "Parâmetro lambda fora do domínio (entre 0 e 1)."
+        self.historico = asarray(historico, dtype=float)
+        assert not isnan(self.historico).any(), "Histórico de PnL não pode conter valores ausentes."
+        self.n_cenarios = n_cenarios
+        self.lambda_ = lambda_
+
+        # Posição de cada cenário do histórico na ordem crescente de valor
+        self._ordenados = argsort(self.historico, kind="stable")
+        self._valores_ordenados = self.historico[self._ordenados]
+        self._postos = zeros(len(self.historico), dtype=int)
+        self._postos[self._ordenados] = arange(len(self.historico))
+
+        self._contagens = _ArvoreFenwick(len(self.historico))
+        self._pesos = _ArvoreFenwick(len(self.historico))
+        self._passos_reconstrucao = (
+            None if lambda_ == 1 else max(int(self._ORDEM_MAXIMA_PESOS / -log10(lambda_)), 1)
+        )
+        self.inicio = 0
+        self.fim = 0
+        self._origem = 0
+
+    def __len__(self) -> int:
+        return self.fim - self.inicio
+
+    def mover_para(self, fim: int) -> "JanelaOrdenada":
+        # Posicionar a janela nos `n_cenarios` cenários anteriores a `fim`; saltos maiores que um cenário reconstroem a janela
+        fim = min(max(fim, 0), len(self.historico))
+        inicio = max(fim - self.n_cenarios, 0)
+        if fim < self.fim or inicio >= self.fim:
+            self._reconstruir(inicio, fim)
+            return self
+
+        for i in range(self.inicio, inicio):
+            self._remover(i)
+        for i in range(self.fim, fim):
+            self._inserir(i)
+        self.inicio, self.fim = inicio, fim
+
+        # Renormalizar pesos antes que cresçam a ponto de perder precisão
+        if self._passos_reconstrucao is not None and self.fim - self._origem > self._passos_reconstrucao:
+            self._reconstruir(self.inicio, self.fim)
+        return self
+
+    def avancar(self) -> "JanelaOrdenada":
+        return self.mover_para(self.fim + 1)
+
+    def quantil(self, percentil: float) -> float:
+        # Quantil empírico com interpolação linear, como em Series.quantile
+        assert len(self) > 0, "Janela vazia."
+        indice = percentil * (len(self) - 1)
+        inferior = floor(indice)
+        valor_inferior = self._k_esimo(inferior)
+        if indice == inferior:
+            return valor_inferior
+        return valor_inferior + (indice - inferior) * (self._k_esimo(inferior + 1) - valor_inferior)
+
+    def quantil_ponderado(self, percentil: float) -> float:
+        # Menor PnL cujo peso acumulado, em ordem crescente de PnL, atinge o percentil (método de Boudoukh)
+        assert len(self) > 0, "Janela vazia."
+        return float(self._valores_ordenados[self._pesos.buscar(percentil * self._pesos.total())])
+
+    def _k_esimo(self, k: int) -> float:
+        # k-ésimo menor valor da janela (base zero)
+        return float(self._valores_ordenados[self._contagens.buscar(k + 1)])
+
+    def _peso(self, i: int) -> float:
+        # Peso de Boudoukh relativo à origem da árvore, para não atualizar os demais cenários a cada passo
+        return self.lambda_ ** (self._origem - i)
+
+    def _inserir(self, i: int) -> None:
+        self._contagens.somar(self._postos[i], 1.0)
+        self._pesos.somar(self._postos[i], self._peso(i))
+
+    def _remover(self, i: int) -> None:
+        self._contagens.somar(self._postos[i], -1.0)
+        self._pesos.somar(self._postos[i], -self._peso(i))
+
+    def _reconstruir(self, inicio: int, fim: int) -> None:
+        self.inicio, self.fim, self._origem = inicio, fim, inicio
+        indices = arange(inicio, fim)
+
+        contagens = zeros(len(self.historico), dtype=float)
+        pesos = zeros(len(self.historico), dtype=float)
+        contagens[self._postos[indices]] = 1.0
+        pesos[self._postos[indices]] = self.lambda_ ** (self._origem - indices.astype(float))
+        self._contagens.construir(contagens)
+        self._pesos.construir(pesos)
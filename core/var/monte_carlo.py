@@ -0,0 +1,296 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from math import ceil, sqrt
+from typing import Optional
+
+from numpy import array, asarray, clip, concatenate, isfinite, linalg, ndarray, quantile, sort, zeros
+from numpy.random import SeedSequence, default_rng
+from pandas import to_datetime
+from scipy.stats import norm
+
+from core.carteira import Carteira
+from core.fatores_risco.black_scholes import bs_price
+from core.fatores_risco.fatores_risco import MatrizFatoresRisco, nomear_vetor_fator_risco
+from core.fatores_risco.opcoes import CacheAnaliticosOpcoes
+from core.renda_fixa.futuros_di import FuturosDI
+from core.renda_fixa.renda_fixa import RendaFixa
+from core.var.quadratica import AproximacaoQuadratica
+from inputs.data_handler import InputsDataHandler
+from utils.enums import AcoesBr, AcoesUs, Colunas, FatoresRisco, Futuros, IntervaloConfianca, Localidade, Opcoes, \
+                        TipoFuturo, Titulos
+
+
+class VarMonteCarlo:
+    """
+    VaR por simulação de Monte Carlo dos fatores de risco, com covariância EWMA ou GARCH.
+    """
+    METODOS_COVARIANCIA = ("ewma", "garch")
+    MODOS = ("reavaliacao", "delta_gama")
+    _FATORACOES: dict[str, ndarray] = {}
+
+    def __init__(
+            self,
+            carteira: Carteira,
+            retornos: MatrizFatoresRisco,
+            inputs: InputsDataHandler,
+            intervalo_confianca: IntervaloConfianca,
+            metodo_covariancia: str = "ewma",
+            semente: Optional[int] = None,
+            max_workers: Optional[int] = None,
+            modo: str = "reavaliacao"
+    ):
+        assert metodo_covariancia in self.METODOS_COVARIANCIA, f"Método de covariância desconhecido: {metodo_covariancia}."
+        assert modo in self.MODOS, f"Modo de avaliação desconhecido: {modo}."
+        self.carteira = carteira
+        self.retornos = retornos
+        self.inputs = inputs
+        self.intervalo_confianca = intervalo_confianca
+        self.metodo_covariancia = metodo_covariancia
+        self.semente = semente
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.modo = modo
+        self.resultado: dict = {}
+
+    def var_monte_carlo_carteira(
+            self,
+            n_max: int = 200000,
+            tamanho_lote: int = 10000,
+            tolerancia: float = 0.01
+    ) -> float:
+        pnl = self.simular(n_max, tamanho_lote, tolerancia)
+        return float(abs(quantile(pnl, self._percentil())))
+
+    def simular(self, n_max: int = 200000, tamanho_lote: int = 10000, tolerancia: float = 0.01) -> ndarray:
+        # PnL da carteira em lotes, até `n_max` cenários ou até o erro padrão do quantil atingir a tolerância
+        assert n_max > 0 and tamanho_lote > 0, "Número de cenários e tamanho do lote devem ser positivos."
+        fatores, cov = self.matriz_covariancia()
+        fatoracao = self.fatorar(cov)
+        plano = self._plano_reavaliacao(fatores)
+        aproximacao = AproximacaoQuadratica.de_plano(plano, fatores) if self.modo == "delta_gama" else None
+
+        # Um fluxo aleatório independente por lote, definido apenas pela semente e pela ordem do lote
+        n_lotes = ceil(n_max / tamanho_lote)
+        sementes = SeedSequence(self.semente).spawn(n_lotes)
+        tamanhos = [min(tamanho_lote, n_max - i * tamanho_lote) for i in range(n_lotes)]
+
+        lotes, erro_padrao, convergiu = [], float("nan"), False
+        n_workers = min(self.max_workers, n_lotes)
+        executor = ProcessPoolExecutor(n_workers) if n_workers > 1 else None
+        try:
+            for inicio in range(0, n_lotes, n_workers):
+                argumentos = [(plano, fatoracao, sementes[i], tamanhos[i], aproximacao) for i in range(inicio, min(inicio + n_workers, n_lotes))]
+                resultados = executor.map(_simular_lote, *zip(*argumentos)) if executor else map(_simular_lote, *zip(*argumentos))
+
+                # Avaliar a parada lote a lote, para que o resultado não dependa do número de processos
+                for pnl_lote in resultados:
+                    lotes.append(pnl_lote)
+                    erro_padrao, var = self._erro_padrao_quantil(concatenate(lotes))
+                    if erro_padrao <= tolerancia * abs(var):
+                        convergiu = True
+                        break
+                if convergiu:
+                    break
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        pnl = concatenate(lotes)
+        self.resultado = {
+            "cenarios": len(pnl),
+            "lotes": len(lotes),
+            "erro_padrao": erro_padrao,
+            "convergiu": convergiu,
+            "modo": self.modo,
+            "fatores": fatores
+        }
+        return pnl
+
+    def aproximacao_quadratica(self) -> AproximacaoQuadratica:
+        # Sensibilidades delta-gama-vega da carteira nos fatores da matriz de covariância
+        fatores, _ = self.matriz_covariancia()
+        return AproximacaoQuadratica.de_plano(self._plano_reavaliacao(fatores), fatores)
+
+    def erro_aproximacao_quadratica(self, n_cenarios: int = 20000, choques: Optional[ndarray] = None) -> dict:
+        # Erro da aproximação delta-gama-vega frente à reavaliação completa nos mesmos choques, com o tempo de cada uma
+        fatores, cov = self.matriz_covariancia()
+        if choques is None:
+            fatoracao = self.fatorar(cov)
+            choques = default_rng(self.semente).standard_normal((n_cenarios, fatoracao.shape[0])) @ fatoracao.T
+        plano = self._plano_reavaliacao(fatores)
+
+        inicio = time.perf_counter()
+        pnl_aproximado = AproximacaoQuadratica.de_plano(plano, fatores).pnl(choques)
+        tempo_aproximacao = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        pnl_reavaliacao = _avaliar(plano, choques)
+        tempo_reavaliacao = time.perf_counter() - inicio
+
+        return {
+            **AproximacaoQuadratica.comparar(pnl_aproximado, pnl_reavaliacao, self._percentil()),
+            "cenarios": len(choques),
+            "tempo_aproximacao": tempo_aproximacao,
+            "tempo_reavaliacao": tempo_reavaliacao
+        }
+
+    def matriz_covariancia(self) -> tuple[list[str], ndarray]:
+        cov = (
+            self.retornos.matriz_cov_ewma()
+            if self.metodo_covariancia == "ewma"
+            else
+            self.retornos.matriz_cov_garch()
+        )
+        return cov.columns.to_list(), cov.to_numpy(dtype=float)
+
+    @classmethod
+    def fatorar(cls, cov: ndarray) -> ndarray:
+        # Matriz A com A Aᵀ = cov (Cholesky, ou espectral se não positiva definida), guardada por conteúdo da matriz
+        chave = sha256(asarray(cov, dtype=float).tobytes()).hexdigest()
+        if chave not in cls._FATORACOES:
+            try:
+                fatoracao = linalg.cholesky(cov)
+            except linalg.LinAlgError:
+                autovalores, autovetores = linalg.eigh(cov)
+                fatoracao = autovetores * clip(autovalores, 0, None) ** 0.5
+            cls._FATORACOES[chave] = fatoracao
+        return cls._FATORACOES[chave]
+
+    def _erro_padrao_quantil(self, pnl: ndarray) -> tuple[float, float]:
+        # Quantil do PnL e seu erro padrão, pelas estatísticas de ordem do intervalo de 95% do quantil
+        p = self._percentil()
+        n = len(pnl)
+        ordenado = sort(pnl)
+        z = norm.ppf(0.975)
+        desvio = z * sqrt(n * p * (1 - p))
+        inferior = int(max(round(n * p - desvio), 0))
+        superior = int(min(round(n * p + desvio), n - 1))
+        return float((ordenado[superior] - ordenado[inferior]) / (2 * z)), float(quantile(ordenado, p))
+
+    def _percentil(self) -> float:
+        return 1 - int(self.intervalo_confianca.name.split("P")[1])/100
+
+    def _plano_reavaliacao(self, fatores: list[str]) -> list[tuple]:
+        # Dados de referência de cada instrumento (tipo, quantidade, índices, parâmetros), enviados aos processos
+        mercado = self.inputs.mercado()
+        data_referencia = to_datetime(self.carteira.data_referencia)
+        colunas = {fator: j for j, fator in enumerate(fatores)}
+
+        plano = []
+        for posicao in self.carteira.posicoes_agregadas():
+            indices = {fr: colunas[nomear_vetor_fator_risco(fr, posicao)] for fr in posicao.fatores_risco}
+            indice_cambio = indices.get(FatoresRisco.CAMBIO_USDBRL, -1) if posicao.localidade == Localidade.US else -1
+
+            if isinstance(posicao.ativo, (AcoesBr, AcoesUs)):
+                precos = mercado.acoes_br if posicao.localidade == Localidade.BR else mercado.acoes_us
+                moeda = mercado.fx.MOEDA_LOCAL if posicao.localidade == Localidade.BR else mercado.fx.DOLAR
+                nocional = precos.asof(data_referencia, posicao.ativo.value) * mercado.fx.reais_por_unidade(moeda, data_referencia)
+                plano.append(("linear", posicao.quantidade, (indices[FatoresRisco.ACAO], indice_cambio), (nocional,)))
+
+            elif isinstance(posicao.ativo, Opcoes):
+                opcao = CacheAnaliticosOpcoes.compartilhado().obter(posicao.instrumento, data_referencia, self.inputs)
+                S = mercado.acoes_br.asof(data_referencia, posicao.produto.value)
+                parametros = (S, opcao.K, opcao.T - (1/252), opcao.tipo, opcao.vol_implicita/100, opcao.preco)
+                plano.append(("opcao", posicao.quantidade, (indices[FatoresRisco.ACAO], indices[FatoresRisco.VOLATILIDADE]), parametros))
+
+            elif isinstance(posicao.ativo, Futuros) and posicao.produto == TipoFuturo.IBOV:
+                nocional = mercado.acoes_br.asof(data_referencia, posicao.produto.value)
+                plano.append(("linear", posicao.quantidade, (indices[FatoresRisco.ACAO], -1), (nocional,)))
+
+            elif isinstance(posicao.ativo, Futuros) and posicao.produto == TipoFuturo.DI:
+                futuro = FuturosDI.de_posicoes([posicao], data_referencia, self.inputs)
+                parametros = (float(futuro.taxas_referencia()[0]), int(futuro.du[0]), float(futuro.valor_face[0]))
+                plano.append(("di", posicao.quantidade, (indices[FatoresRisco.JUROS],), parametros))
+
+            elif isinstance(posicao.ativo, Futuros):
+                nocional = mercado.fx.converter(100000, posicao.instrumento.moeda, data_referencia)
+                fator = next(iter(indices.values()))
+                plano.append(("linear", posicao.quantidade, (fator, -1), (nocional,)))
+
+            elif isinstance(posicao.ativo, Titulos):
+                rf = RendaFixa(
+                    data_referencia,
+                    to_datetime(posicao.vencimento).date(),
+                    posicao.localidade,
+                    self.inputs,
+                    cupom=float(posicao.instrumento.cupom),
+                    taxa=float(posicao.instrumento.taxa)
+                )
+                _, _, total_periodos = rf._base_semestral(0, 0.1, 0.1, (rf.vencimento - rf.data_referencia).days)
+                curva = rf.curva_juros()
+                curva = curva.loc[curva[Colunas.DATA.value] <= data_referencia]
+                taxa = float(curva.loc[curva[Colunas.DATA.value] == curva[Colunas.DATA.value].max()][Colunas.VALOR.value].values[0])
+                moeda = mercado.fx.DOLAR if posicao.localidade == Localidade.US else mercado.fx.MOEDA_LOCAL
+                nocional = rf.VALOR_FACE * mercado.fx.reais_por_unidade(moeda, data_referencia)
+                parametros = (nocional, taxa, rf.fluxos_semestrais(rf.cupom, total_periodos))
+                plano.append(("titulo", posicao.quantidade, (indices[FatoresRisco.JUROS], indice_cambio), parametros))
+
+            else:
+                raise ValueError("Ativo não mapeado.")
+
+            # Falhar na montagem do plano ao invés de somar posições sem dados de referência como PnL nulo
+            _, quantidade, _, parametros = plano[-1]
+            if not (isfinite(quantidade) and all(isfinite(asarray(p, dtype=float)).all() for p in parametros)):
+                raise ValueError(f"Dados de referência indisponíveis para reavaliar a posição {posicao.ativo.name}.")
+
+        return plano
+
+
+def _simular_lote(
+        plano: list[tuple],
+        fatoracao: ndarray,
+        semente: SeedSequence,
+        n_cenarios: int,
+        aproximacao: Optional[AproximacaoQuadratica] = None
+) -> ndarray:
+    # Sortear choques correlacionados e avaliar a carteira no lote, por reavaliação ou pela aproximação quadrática
+    choques = default_rng(semente).standard_normal((n_cenarios, fatoracao.shape[0])) @ fatoracao.T
+    return aproximacao.pnl(choques) if aproximacao is not None else _avaliar(plano, choques)
+
+
+def _avaliar(plano: list[tuple], choques: ndarray) -> ndarray:
+    # PnL da carteira por reavaliação completa de todas as posições
+    return array([_reavaliar(item, choques) for item in plano]).sum(axis=0) if plano else zeros(len(choques))
+
+
+def _reavaliar(item: tuple, choques: ndarray) -> ndarray:
+    tipo, quantidade, indices, parametros = item
+
+    if tipo == "linear":
+        # PnL proporcional ao nocional, com efeito cambial multiplicativo para ativos no exterior
+        indice, indice_cambio = indices
+        (nocional,) = parametros
+        retorno = 1 + choques[:, indice]
+        if indice_cambio >= 0:
+            retorno = retorno * (1 + choques[:, indice_cambio])
+        return quantidade * nocional * (retorno - 1)
+
+    if tipo == "opcao":
+        S, K, T, call_put, vol, preco = parametros
+        cenario_preco = bs_price(
+            S * (1 + choques[:, indices[0]]),
+            K, T, 0, 0,
+            clip(vol + choques[:, indices[1]], 1e-4, None) * 100,
+            call_put, 1
+        )
+        return quantidade * (cenario_preco - preco)
+
+    if tipo == "di":
+        # Posição tomada em taxa, como em FuturosDI.cenarios_pnl: ganha com a alta de taxa
+        taxa, du, valor_face = parametros
+        pu = FuturosDI.pu(taxa, du, valor_face)
+        return quantidade * (pu - FuturosDI.pu(taxa + choques[:, indices[0]], du, valor_face))
+
+    if tipo == "titulo":
+        # Reavaliar o fluxo semestral com a taxa chocada (mantida no domínio aceito pela precificação)
+        nocional, taxa, fluxos = parametros
+        indice, indice_cambio = indices
+        taxas = clip(asarray([taxa, *(taxa + choques[:, indice])]) / 200, 1e-10, 1)
+        pu = RendaFixa.pu_fluxos(RendaFixa.fatores_desconto(taxas, len(fluxos)), fluxos, 1.0)[:, 0]
+        retorno = pu[1:] / pu[0]
+        if indice_cambio >= 0:
+            retorno = retorno * (1 + choques[:, indice_cambio])
+        return quantidade * nocional * (retorno - 1)
+
+    raise ValueError("Tipo de reavaliação desconhecido.")
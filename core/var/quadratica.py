@@ -0,0 +1,124 @@
+from math import isfinite
+from typing import Union
+
+from numpy import abs as np_abs
+from numpy import asarray, atleast_2d, clip, einsum, ndarray, quantile, sqrt, zeros
+from pandas import DataFrame, Series
+
+from core.fatores_risco.black_scholes import bs_gregas
+from core.renda_fixa.futuros_di import FuturosDI
+from core.renda_fixa.renda_fixa import RendaFixa
+
+
+class AproximacaoQuadratica:
+    """
+    Aproximação delta-gama-vega do PnL da carteira: PnL(x) = c + δ·x + ½ xᵀΓx, com x os choques dos fatores.
+    """
+    def __init__(self, constante: float, delta: ndarray, gama: ndarray, fatores: list[str]):
+        assert gama.shape == (len(delta), len(delta)) and len(delta) == len(fatores), "Dimensões incompatíveis com os fatores."
+        self.constante = constante
+        self.delta = delta
+        self.gama = gama
+        self.fatores = fatores
+
+    @classmethod
+    def de_plano(cls, plano: list[tuple], fatores: list[str]) -> "AproximacaoQuadratica":
+        # Montar a partir do plano de reavaliação do Monte Carlo; sensibilidades não finitas interrompem a montagem,
+        # para que nenhuma posição seja omitida da aproximação
+        constante, delta, gama = 0.0, zeros(len(fatores)), zeros((len(fatores), len(fatores)))
+        for k, item in enumerate(plano):
+            c, primeira, segunda = cls._sensibilidades(item)
+            valores = [c, *(v for _, v in primeira), *(v for _, _, v in segunda)]
+            if not all(isfinite(v) for v in valores):
+                raise ValueError(f"Sensibilidades não finitas para o item {k} do plano de reavaliação ({item[0]}).")
+
+            constante += c
+            for i, valor in primeira:
+                delta[i] += valor
+            for i, j, valor in segunda:
+                gama[i, j] += valor
+                if i != j:
+                    gama[j, i] += valor
+
+        return cls(constante, delta, gama, fatores)
+
+    def pnl(self, choques: Union[ndarray, DataFrame]) -> ndarray:
+        # PnL da carteira em cada cenário (cenários × fatores); em DataFrame, fatores ausentes são choques nulos
+        if isinstance(choques, DataFrame):
+            choques = choques.reindex(columns=self.fatores).fillna(0).to_numpy(dtype=float)
+        choques = atleast_2d(asarray(choques, dtype=float))
+        return self.constante + choques @ self.delta + 0.5 * einsum("ij,ij->i", choques @ self.gama, choques)
+
+    def sensibilidades(self) -> DataFrame:
+        # Delta e termo diagonal de gama por fator
+        return DataFrame(
+            {"delta": self.delta, "gama": self.gama.diagonal()},
+            index=Series(self.fatores, name="fator")
+        )
+
+    @staticmethod
+    def comparar(pnl_aproximado: ndarray, pnl_reavaliacao: ndarray, percentil: float) -> dict:
+        # Erro da aproximação em relação à reavaliação completa, no VaR e cenário a cenário
+        var_aproximado = float(abs(quantile(pnl_aproximado, percentil)))
+        var_reavaliacao = float(abs(quantile(pnl_reavaliacao, percentil)))
+        erros = pnl_aproximado - pnl_reavaliacao
+        return {
+            "var_aproximado": var_aproximado,
+            "var_reavaliacao": var_reavaliacao,
+            "erro_var": var_aproximado - var_reavaliacao,
+            "erro_var_relativo": (var_aproximado - var_reavaliacao) / var_reavaliacao if var_reavaliacao else float("nan"),
+            "erro_pnl_rmse": float(sqrt((erros ** 2).mean())),
+            "erro_pnl_maximo": float(np_abs(erros).max())
+        }
+
+    @staticmethod
+    def _sensibilidades(item: tuple) -> tuple[float, list[tuple[int, float]], list[tuple[int, int, float]]]:
+        # Termo constante, derivadas primeiras (fator, valor) e segundas (fator, fator, valor) de um instrumento
+        tipo, quantidade, indices, parametros = item
+
+        if tipo == "linear":
+            # PnL = N[(1 + a)(1 + c) - 1]: exato com o termo cruzado entre ativo e câmbio
+            indice, indice_cambio = indices
+            nocional = quantidade * parametros[0]
+            if indice_cambio < 0:
+                return 0.0, [(indice, nocional)], []
+            return 0.0, [(indice, nocional), (indice_cambio, nocional)], [(indice, indice_cambio, nocional)]
+
+        if tipo == "opcao":
+            S, K, T, call_put, vol, preco = parametros
+            gregas = bs_gregas(S, K, T, 0, 0, vol * 100, call_put, 1)
+            indice_acao, indice_vol = indices
+            return (
+                quantidade * (float(gregas["preco"]) - preco),
+                [(indice_acao, quantidade * float(gregas["delta"]) * S), (indice_vol, quantidade * float(gregas["vega"]))],
+                [(indice_acao, indice_acao, quantidade * float(gregas["gamma"]) * S ** 2)]
+            )
+
+        if tipo == "di":
+            # Derivadas de -PU, com PU = F / (1 + r/100)^(du/252), em relação à taxa em pontos percentuais
+            # (posição tomada em taxa, como na reavaliação)
+            taxa, du, valor_face = parametros
+            prazo = du / 252
+            pu = float(FuturosDI.pu(taxa, du, valor_face))
+            base = 1 + taxa / 100
+            primeira = prazo * pu / (100 * base)
+            segunda = -prazo * (prazo + 1) * pu / (100 * base) ** 2
+            return 0.0, [(indices[0], quantidade * primeira)], [(indices[0], indices[0], quantidade * segunda)]
+
+        if tipo == "titulo":
+            # Duration e convexidade do fluxo semestral, convertidas para a taxa anual em pontos percentuais
+            nocional, taxa, fluxos = parametros
+            indice, indice_cambio = indices
+            pu, primeira, segunda = RendaFixa.sensibilidades_fluxos(clip(taxa / 200, 1e-10, 1), fluxos)
+            nocional = quantidade * nocional
+            primeira = nocional * float(primeira[0, 0] / pu[0, 0]) / 200
+            segunda = nocional * float(segunda[0, 0] / pu[0, 0]) / 200 ** 2
+            if indice_cambio < 0:
+                return 0.0, [(indice, primeira)], [(indice, indice, segunda)]
+            return (
+                0.0,
+                [(indice, primeira), (indice_cambio, nocional)],
+                [(indice, indice, segunda), (indice, indice_cambio, primeira)]
+            )
+
+        raise ValueError("Tipo de reavaliação desconhecido.")
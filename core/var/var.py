@@ -1,16 +1,23 @@
 from datetime import date
-from math import sqrt
-
-from numpy import array, inf, log
-from numpy import sum as np_sum
-from pandas import DataFrame, Series, to_datetime, concat
+from math import isclose, isfinite, sqrt
+from typing import Optional, Union
+
+from numpy import arange, argsort, array, asarray, atleast_1d, atleast_2d, broadcast_arrays, broadcast_to, concatenate, \
+                  einsum, errstate, full, inf, isinf, isnan, nan, nanquantile, nanstd, ndarray, ones, stack, take_along_axis, where, zeros
+from numpy import sqrt as sqrt_vetor
+from pandas import DataFrame, Series, date_range, to_datetime, concat
+from scipy.special import xlogy
 from scipy.stats import chi2
 
-from core.carteira import Carteira, Posicao
-from core.fatores_risco.black_scholes import bs_implied_vol, bs_price
+from core.carteira import Carteira
+from core.fatores_risco.black_scholes import bs_price
 from core.fatores_risco.exposicao import ExposicaoCarteira
 from core.fatores_risco.fatores_risco import MatrizFatoresRisco, nomear_vetor_fator_risco, CalculosFatoresRisco
+from core.fatores_risco.opcoes import CacheAnaliticosOpcoes
+from core.renda_fixa.futuros_di import FuturosDI
 from core.renda_fixa.renda_fixa import RendaFixa
+from core.var.cenarios import CuboCenarios
+from core.var.janela import JanelaOrdenada
 from inputs.data_handler import InputsDataHandler
 from utils.enums import IntervaloConfianca, AcoesBr, AcoesUs, Opcoes, Futuros, TipoFuturo, Titulos, \
                         Localidade, Colunas, TipoVarHistorico
@@ -44,7 +51,7 @@ class VarParametrico:
         percent_fatores_risco = self._participacao_percentual_fatores_risco(exposicao)
 
         # Percorrer cada posição da carteira
-        posicoes = [p for p in self.carteira.__dict__.values() if isinstance(p, Posicao)]
+        posicoes = self.carteira.posicoes
 
         lista_participacao = []
         for posicao in posicoes:
@@ -68,7 +75,7 @@ class VarParametrico:
         
         # Concatenar participações percentuais de cada posição
         participacao_df = concat(lista_participacao, axis=1).fillna(0).reset_index(drop=True)
-        assert float(participacao_df.values.sum()) == 1.0, "Participação percentual das posições não soma 100%."
+        assert isclose(float(participacao_df.values.sum()), 1.0), "Participação percentual das posições não soma 100%."
         return participacao_df
 
     def _participacao_percentual_fatores_risco(self, exposicao: DataFrame) -> DataFrame:
@@ -83,35 +90,26 @@ class VarParametrico:
         return var_componente / componente_total
 
     def var_parametrico_posicao(self) -> DataFrame:
-        # Percorrer cada posição da carteira
-        posicoes = [p for p in self.carteira.__dict__.values() if isinstance(p, Posicao)]
-
-        lista_var = []
-        for posicao in posicoes:
-            # Nomear posicao
-            nome_posicao = posicao.ativo.name if isinstance(posicao.ativo, (AcoesBr, AcoesUs)) else posicao.produto.name
+        # VaR isolado de cada posição, z·sqrt(e_i Σ e_iᵀ), com uma única matriz de exposições e de covariância
+        matriz_cov = self.retornos_fatores_risco.matriz_cov_ewma()
+        exposicoes = self.exposicoes.matriz_exposicao().reindex(columns=matriz_cov.columns, fill_value=0)
 
-            # Instanciar carteira simples para cálculo de exposição
-            carteira_simples = Carteira([posicao], self.carteira.data_referencia)
-        
-            # Calcular exposição da posição aos fatores de risco da carteira e o quanto a posição 
-            # é representativa para a exposição ao fator de risco na carteira
-            exposicao_posicao = ExposicaoCarteira(carteira_simples, self.exposicoes.inputs).exposicao_carteira()
+        # Nomear posições
+        nomes_posicoes = [
+            posicao.ativo.name if isinstance(posicao.ativo, (AcoesBr, AcoesUs)) else posicao.produto.name
+            for posicao in self.carteira.posicoes
+        ]
 
-            # Calcular retornos dos fatores de risco
-            fatores_risco = MatrizFatoresRisco(carteira_simples, self.exposicoes.inputs).matriz_cov_ewma()
+        return DataFrame(
+            [self._calculo_var_posicoes(exposicoes.values, matriz_cov.values, self.intervalo_confianca.value)],
+            columns=nomes_posicoes
+        )
 
-            # Calcular VaR da posição
-            var_posicao = DataFrame({nome_posicao: [self._calculo_var_matricial(
-                exposicao_posicao.values, 
-                fatores_risco.values, 
-                self.intervalo_confianca.value
-            )]})
-            
-            lista_var.append(var_posicao)
+    @staticmethod
+    def _calculo_var_posicoes(matriz_exposicao: ndarray, matriz_retorno: ndarray, intervalo_confianca: float) -> ndarray:
+        # Forma quadrática de cada linha da matriz de exposições em uma única operação
+        return sqrt_vetor(einsum("ik,kl,il->i", matriz_exposicao, matriz_retorno, matriz_exposicao) * (intervalo_confianca ** 2))
 
-        return DataFrame(concat(lista_var, axis=1))
-    
     @staticmethod
     def _calculo_var_matricial(vetor_exposicao: array, matriz_retorno: array, intervalo_confianca: float) -> float:
         return sqrt((vetor_exposicao @ matriz_retorno @ vetor_exposicao.T) * (intervalo_confianca ** 2))
@@ -189,8 +187,32 @@ class VarHistorico:
         self.tipo = tipo
 
     def _gerar_cenarios(self, n_cenarios: int) -> DataFrame:
+        return self.gerar_cubo(n_cenarios).para_dataframe()
+
+    def gerar_cubo(self, n_cenarios: int) -> CuboCenarios:
         retornos = self.retornos.fatores_risco_carteira()
-        posicoes = [p for p in self.carteira.__dict__.values() if isinstance(p, Posicao)]
+        posicoes = self.carteira.posicoes_agregadas()
+        mercado = self.inputs.mercado()
+        data_referencia = to_datetime(self.carteira.data_referencia)
+
+        # Reprecificar todos os contratos de DI futuro de uma só vez, nas datas dos cenários (datas × contratos)
+        futuros_di = [p for p in posicoes if isinstance(p.ativo, Futuros) and p.produto == TipoFuturo.DI]
+        contratos_di = [p.ativo for p in futuros_di]
+        if futuros_di:
+            pnl_futuros_di = FuturosDI.de_posicoes(futuros_di, data_referencia, self.inputs).cenarios_pnl(
+                [p.quantidade for p in futuros_di],
+                retornos.index.to_numpy(dtype="datetime64[ns]")
+            )
+
+        # Converter para reais, em uma única operação, o nocional de todos os futuros de câmbio
+        futuros_cambio = [
+            p for p in posicoes 
+            if isinstance(p.ativo, Futuros) and p.produto not in [TipoFuturo.DI, TipoFuturo.IBOV]
+        ]
+        nocionais_cambio = dict(zip(
+            [p.ativo for p in futuros_cambio],
+            mercado.fx.converter(100000, [p.instrumento.moeda for p in futuros_cambio], data_referencia)
+        )) if futuros_cambio else {}
         
         lista_pnl_posicao = []
         for posicao in posicoes:
@@ -205,22 +227,13 @@ class VarHistorico:
             # Pegar valores de referência para a geração de cenários
             if isinstance(posicao.ativo, AcoesBr) or isinstance(posicao.ativo, AcoesUs):
                 if posicao.localidade == Localidade.BR:
-                    nocional = self.inputs.acoes_br()
+                    precos = mercado.acoes_br
                     cambio = 1.0
                 else:
-                    nocional = self.inputs.acoes_us()
-                    cambio = self.inputs.fx()
-                    data_ref = cambio.loc[cambio[Colunas.DATA.value] <= to_datetime(self.carteira.data_referencia)][Colunas.DATA.value].max()
-                    cambio = float(cambio.loc[
-                        (cambio[Colunas.CAMBIO.value] == TipoFuturo.USDBRL.name) &
-                        (cambio[Colunas.DATA.value] == data_ref)
-                    ][Colunas.VALOR.value].values[0])
+                    precos = mercado.acoes_us
+                    cambio = mercado.fx.reais_por_unidade(mercado.fx.DOLAR, data_referencia)
                     
-                data_ref = nocional.loc[nocional[Colunas.DATA.value] <= to_datetime(self.carteira.data_referencia)][Colunas.DATA.value].max()
-                nocional = float(nocional.loc[
-                    (nocional[Colunas.ATIVO.value] == posicao.ativo.value) &
-                    (nocional[Colunas.DATA.value] == data_ref)
-                ][Colunas.PRECO.value].values[0])
+                nocional = precos.asof(data_referencia, posicao.ativo.value)
 
                 retorno = (
                     (1 + retornos_posicao[posicao.ativo.name]) * (1 + retornos_posicao[TipoFuturo.USDBRL.name])
@@ -237,28 +250,31 @@ class VarHistorico:
 
             elif isinstance(posicao.ativo, Opcoes):
                 # Recuperar informações de opções
-                acoes = self.inputs.acoes_br()
-                acoes = acoes.loc[acoes[Colunas.ATIVO.value] == posicao.produto.value][[Colunas.DATA.value, Colunas.PRECO.value]]
-                opcoes = self.inputs.opcoes()
-                opcoes = opcoes.loc[opcoes[Colunas.ID.value] == posicao.ativo.value]
-
-                # Definir características da opção
-                S = float(opcoes["strike"].values[0])
-                K = float(opcoes["nocional"].values[0])
-                T = RendaFixa.calcular_du(to_datetime(self.carteira.data_referencia), to_datetime(opcoes["vencimento"].values[0]), self.inputs)/252
-                preco_opcao = float(opcoes["preco"].values[0])
-                tipo = 1 if opcoes["tipo"].values[0] == "call" else -1
-
-                # Calcular propriedades Black-Scholes
-                vol_implicita = float(bs_implied_vol(S, K, T, 0, 0, preco_opcao, tipo, 1))
+                acoes = (
+                    mercado.acoes_br.janela(instrumentos=[posicao.produto.value])
+                    .rename(columns={posicao.produto.value: Colunas.PRECO.value})
+                    .reset_index()
+                )
+                opcao = CacheAnaliticosOpcoes.compartilhado().obter(posicao.instrumento, data_referencia, self.inputs)
+
+                # Definir características da opção e volatilidade implícita
+                K = opcao.K
+                T = opcao.T
+                preco_opcao = opcao.preco
+                tipo = opcao.tipo
+                vol_implicita = opcao.vol_implicita
+                if not isfinite(vol_implicita):
+                    raise ValueError(f"Volatilidade implícita indisponível para a opção {posicao.ativo.name}.")
                 coluna_vol = [c for c in retornos_posicao.columns if "VOL" in c][0]
 
-                # Precificar cenários de preço da opção
+                # Precificar cenários de preço da opção, com a volatilidade chocada limitada ao piso do cálculo implícito
                 retornos_posicao = retornos_posicao.merge(acoes, on=Colunas.DATA.value)
-                retornos_posicao["cenario_vol"] = retornos_posicao[coluna_vol] + vol_implicita/100
-                retornos_posicao["cenario_preco"] = retornos_posicao.apply(
-                    lambda row: bs_price(row[Colunas.PRECO.value], K, T-(1/252), 0, 0, row["cenario_vol"]*100, tipo, 1),
-                    axis=1
+                retornos_posicao["cenario_vol"] = (
+                    (retornos_posicao[coluna_vol] + vol_implicita/100).clip(lower=CacheAnaliticosOpcoes.VOL_MINIMA/100)
+                )
+                retornos_posicao["cenario_preco"] = bs_price(
+                    retornos_posicao[Colunas.PRECO.value].to_numpy(dtype=float),
+                    K, T-(1/252), 0, 0, retornos_posicao["cenario_vol"].to_numpy(dtype=float)*100, tipo, 1
                 )
                 
                 # Produzir cenários de P&L
@@ -269,15 +285,8 @@ class VarHistorico:
                 )
             
             elif isinstance(posicao.ativo, Futuros) and posicao.produto == TipoFuturo.IBOV:
-                # Recuperar informações de IBOV
-                acoes = self.inputs.acoes_br()
-                acoes = acoes.loc[acoes[Colunas.ATIVO.value] == posicao.produto.value]
-
-                # Definir referência de preço e data de avaliação
-                data_ref = acoes.loc[acoes[Colunas.DATA.value] <= to_datetime(self.carteira.data_referencia)][Colunas.DATA.value].max()
-                nocional = float(acoes.loc[
-                    (acoes[Colunas.DATA.value] == data_ref)
-                ][Colunas.PRECO.value].values[0])
+                # Definir referência de preço do IBOV na data de avaliação
+                nocional = mercado.acoes_br.asof(data_referencia, posicao.produto.value)
 
                 # Calcular PnL
                 retornos_posicao[Colunas.PNL.value] = self._calcular_pnl(
@@ -287,28 +296,8 @@ class VarHistorico:
                 )
 
             elif isinstance(posicao.ativo, Futuros) and posicao.produto not in [TipoFuturo.DI, TipoFuturo.IBOV]:
-                # Recuperar informações de cambio
-                fx = self.inputs.fx()
-                fx_filtro = fx.loc[fx[Colunas.CAMBIO.value] == posicao.produto.name]
-
-                # Definir referência de preço e data de avaliação
-                data_ref = fx_filtro.loc[fx_filtro[Colunas.DATA.value] <= to_datetime(self.carteira.data_referencia)][Colunas.DATA.value].max()
-                ultimo_cambio = float(fx_filtro.loc[
-                    (fx_filtro[Colunas.DATA.value] == data_ref)
-                ][Colunas.VALOR.value].values[0])
-
-                # Ajustar valor nocional
-                if posicao.produto == TipoFuturo.USDBRL:
-                    dolar_brl = ultimo_cambio
-                    para_dolar = 1.0
-                else:
-                    dolar_brl = float(fx.loc[
-                        (fx[Colunas.DATA.value] == data_ref) &
-                        (fx[Colunas.CAMBIO.value] == TipoFuturo.USDBRL.name)
-                    ][Colunas.VALOR.value].values[0])
-                    para_dolar = ultimo_cambio
-                
-                nocional_ajustado = (100000 / para_dolar) * dolar_brl
+                # Utilizar nocional já convertido para reais na data de avaliação
+                nocional_ajustado = nocionais_cambio[posicao.ativo]
 
                 # Calcular PnL
                 retornos_posicao[Colunas.PNL.value] = self._calcular_pnl(
@@ -318,18 +307,12 @@ class VarHistorico:
                 )
             
             elif isinstance(posicao.ativo, Futuros) and posicao.produto == TipoFuturo.DI:
-                # Calcular PnL
-                nocional = 100000
-                retornos_posicao[Colunas.PNL.value] = self._calcular_pnl(
-                    posicao.quantidade, 
-                    nocional, 
-                    nocional * (1 + retornos_posicao[posicao.produto.value]/100)
-                )
+                # Utilizar PnL do contrato, já reprecificado junto aos demais contratos de DI
+                retornos_posicao[Colunas.PNL.value] = pnl_futuros_di[:, contratos_di.index(posicao.ativo)]
             
             elif isinstance(posicao.ativo, Titulos):
                 # Recuperar informações de títulos
-                metadados_titulos = self.inputs.titulos()
-                metadados_titulos = metadados_titulos.loc[metadados_titulos[Colunas.ID.value] == posicao.ativo.value]
+                titulo = posicao.instrumento
                 titulos = (
                     self.inputs.treasury()
                     if posicao.localidade == Localidade.US
@@ -340,13 +323,12 @@ class VarHistorico:
                 # Utilizar framework de renda fixa para calcular propriedades do título
                 rf = RendaFixa(
                     self.carteira.data_referencia, 
-                    to_datetime(metadados_titulos["vencimento"].values[0]).date(), 
+                    to_datetime(titulo.vencimento).date(), 
                     posicao.localidade, 
                     self.inputs,
-                    cupom=float(metadados_titulos["cupom"].values[0]),
-                    taxa=float(metadados_titulos["taxa"].values[0])
+                    cupom=float(titulo.cupom),
+                    taxa=float(titulo.taxa)
                 )
-                pu = rf.pu()
                 curva_juros = rf.curva_juros()
                 _, _, total_periodos = rf._base_semestral(
                     0,
@@ -355,35 +337,20 @@ class VarHistorico:
                     (rf.vencimento - rf.data_referencia).days
                 )
 
-                # Adicionar dólar ao DataFrame de juros
-                fx = self.inputs.fx()
-                dolar = fx.loc[fx[Colunas.CAMBIO.value] == TipoFuturo.USDBRL.name]\
-                        [[Colunas.DATA.value, Colunas.VALOR.value]]\
-                        .rename(columns={Colunas.VALOR.value: TipoFuturo.USDBRL.name})
-                if posicao.localidade == Localidade.BR:
-                    dolar[TipoFuturo.USDBRL.name] = 1.0
-                curva_juros = curva_juros.merge(dolar, on=Colunas.DATA.value, how="left")
-
-                # Calcular cupons por cada periodo
-                for i in range(1, total_periodos + 1):
-                    coluna_fluxo = f"cupom_{i}"
-                    curva_juros[coluna_fluxo] = curva_juros.apply(
-                        lambda row: rf._vpl(
-                            rf._base_semestral(rf.VALOR_FACE * row[TipoFuturo.USDBRL.name], rf.cupom/100, 0.1, 1)[0], 
-                            row[Colunas.VALOR.value]/200,
-                            i
-                        ), axis=1
-                    )
-                
-                # Calcular pu para cada data
-                curva_juros["total_cupons"] = curva_juros[[f"cupom_{i}" for i in range(1, total_periodos + 1)]].sum(axis=1)
-                curva_juros["pu"] = curva_juros.apply(
-                    lambda row: rf._vpl(
-                            rf.VALOR_FACE * row[TipoFuturo.USDBRL.name], 
-                            row[Colunas.VALOR.value]/200,
-                            total_periodos
-                        ) + row["total_cupons"], axis=1
-                    )
+                # Adicionar ao DataFrame de juros o valor em reais da moeda do título em cada data
+                curva_juros[TipoFuturo.USDBRL.name] = mercado.fx.reais_por_unidade(
+                    mercado.fx.DOLAR if posicao.localidade == Localidade.US else mercado.fx.MOEDA_LOCAL,
+                    curva_juros[Colunas.DATA.value].to_numpy()
+                )
+
+                # Descontar todo o cronograma de fluxos para cada data de uma só vez (datas × períodos)
+                fatores_desconto = rf.fatores_desconto(curva_juros[Colunas.VALOR.value].to_numpy() / 200, total_periodos)
+                fluxos = rf.fluxos_semestrais(rf.cupom, total_periodos)
+                curva_juros["pu"] = rf.pu_fluxos(
+                    fatores_desconto,
+                    fluxos,
+                    rf.VALOR_FACE * curva_juros[TipoFuturo.USDBRL.name].to_numpy()
+                )[:, 0]
                 
                 # Calcular retornos do título
                 curva_juros[Colunas.RETORNO.value] = curva_juros["pu"].pct_change().fillna(0)
@@ -412,19 +379,14 @@ class VarHistorico:
             else:
                 raise ValueError("Ativo não mapeado.")
 
-            df_posicao = retornos_posicao[[
-                Colunas.DATA.value,
-                Colunas.POSICAO.value,
-                Colunas.PNL.value
-            ]]
-
-            lista_pnl_posicao.append(df_posicao)
+            lista_pnl_posicao.append((
+                posicao.ativo.name,
+                retornos_posicao[Colunas.DATA.value].to_numpy(dtype="datetime64[ns]"),
+                retornos_posicao[Colunas.PNL.value].to_numpy(dtype=float)
+            ))
         
-        pnl_carteira = concat(lista_pnl_posicao).sort_values(Colunas.DATA.value, ascending=False).reset_index(drop=True)
-
-        # Filtrar janela de cenários de PnL
-        datas = pnl_carteira[Colunas.DATA.value].drop_duplicates().reset_index(drop=True)[:n_cenarios]
-        return pnl_carteira.loc[pnl_carteira[Colunas.DATA.value].isin(datas)]
+        # Montar cubo com a janela de cenários de PnL
+        return CuboCenarios.de_posicoes(lista_pnl_posicao, n_cenarios)
 
     @staticmethod
     def _calcular_pnl(qtd: float, preco_referencia: float, preco_cenario: Series) -> Series:
@@ -432,7 +394,7 @@ class VarHistorico:
 
     def var_historico_carteira(self, n_cenarios: int, intervalo_confianca: IntervaloConfianca) -> float:
         # LEMBRANDO QUE O VAR É UM VALOR ABSOLUTO
-        cenarios_pnl = self._gerar_cenarios(n_cenarios).groupby(Colunas.DATA.value).sum().reset_index()
+        cenarios_pnl = self.gerar_cubo(n_cenarios).serie_pnl_carteira()
         if self.tipo == TipoVarHistorico.SIMPLES:
             return self._calcular_var_historico(
                 cenarios_pnl[Colunas.PNL.value],
@@ -534,75 +496,250 @@ class VarHistorico:
         return float(abs(cenarios_pnl.quantile(1-ic)))
            
     def estresse_carteira(self, n_cenarios: int) -> float:
-        cenarios_pnl = self._gerar_cenarios(n_cenarios).groupby(Colunas.DATA.value).sum().reset_index()
-        return abs(float(cenarios_pnl[Colunas.PNL.value].min()))
+        return self.gerar_cubo(n_cenarios).estresse()
+
+    def var_historico_posicoes(self, n_cenarios: int, intervalo_confianca: IntervaloConfianca) -> Series:
+        # VaR histórico simples de cada posição isoladamente, a partir dos mesmos cenários da carteira
+        return self.gerar_cubo(n_cenarios).var_posicoes(intervalo_confianca)
+
+    def var_historico_componente(self, n_cenarios: int, intervalo_confianca: IntervaloConfianca) -> Series:
+        # Contribuição de cada posição ao VaR histórico simples da carteira
+        return self.gerar_cubo(n_cenarios).var_componente(intervalo_confianca)
     
     @staticmethod
     def _calcular_volatilidade(cenarios_pnl: Series) -> float:
         return float(cenarios_pnl.std())
 
-
-def backtest_var(violacoes: list[bool], nivel_confianca: float) -> dict:
-    violacoes = array(violacoes)
-    N = len(violacoes)
-    x = np_sum(violacoes)
-    p = 1 - nivel_confianca
-    p_hat = x / N
-
-    # Teste de Kupiec (Cobertura Incondicional)
-    if x == 0 or x == N:
-        LR_uc = 0  # evita log(0)
-    else:
-        LR_uc = -2 * log(
-            ((1 - p) ** (N - x) * p ** x) /
-            ((1 - p_hat) ** (N - x) * p_hat ** x)
+    def var_historico_periodo(
+            self,
+            inicio: date,
+            fim: date,
+            n_cenarios: int,
+            intervalo_confianca: IntervaloConfianca,
+            tipos: tuple[TipoVarHistorico, ...] = (TipoVarHistorico.SIMPLES, TipoVarHistorico.BOUDOUKH, TipoVarHistorico.HULL_WHITE),
+            reescalar_nocionais: bool = True,
+            janela_ordenada: bool = False
+    ) -> DataFrame:
+        """
+        VaR histórico diário entre `inicio` e `fim`, com janela dos `n_cenarios` cenários anteriores a cada dia.
+        """
+        # Metodologia distinta de chamar var_historico_carteira com a carteira de cada dia: lá a janela é sempre
+        # a dos últimos `n_cenarios` cenários da base; aqui termina no dia anterior ao avaliado, e os resultados
+        # diferem
+        reducoes_disponiveis = (
+            (TipoVarHistorico.SIMPLES, TipoVarHistorico.BOUDOUKH)
+            if janela_ordenada
+            else
+            (TipoVarHistorico.SIMPLES, TipoVarHistorico.BOUDOUKH, TipoVarHistorico.HULL_WHITE)
         )
+        assert all(tipo in reducoes_disponiveis for tipo in tipos), "Tipo de VaR histórico não implementado para janelas móveis."
+        assert not (janela_ordenada and reescalar_nocionais), \
+            "Janela ordenada exige histórico único de PnL da carteira (reescalar_nocionais=False)."
+
+        datas = date_range(start=inicio, end=fim).to_numpy(dtype="datetime64[ns]")
+        cubo = self.gerar_cubo(None)
+
+        if janela_ordenada:
+            # Mesmo resultado da ordenação de cada janela, percorrendo o histórico único com uma janela ordenada
+            return DataFrame({
+                Colunas.DATA.value: datas,
+                **self._var_janela_ordenada(cubo, datas, n_cenarios, intervalo_confianca, tipos)
+            })
+
+        # Reescalar PnL das posições pelo nocional de cada dia em relação ao da data de referência (preço de
+        # ações e IBOV, câmbio de ativos e futuros estrangeiros); demais posições mantêm o PnL da referência
+        escalas = None
+        if reescalar_nocionais:
+            posicoes = self.carteira.posicoes_agregadas()
+            nocionais = self._nocionais_referencia(posicoes, datas)
+            nocionais_referencia = self._nocionais_referencia(posicoes, to_datetime(self.carteira.data_referencia).to_datetime64())
+            escalas = nocionais / nocionais_referencia
+        janelas = cubo.janelas_carteira(datas, n_cenarios, escalas)
+
+        reducoes = {
+            TipoVarHistorico.SIMPLES: lambda: self._var_janelas_simples(janelas, intervalo_confianca),
+            TipoVarHistorico.BOUDOUKH: lambda: self._var_janelas_boudoukh(janelas, intervalo_confianca, self.LAMBDA),
+            TipoVarHistorico.HULL_WHITE: lambda: self._var_janelas_hull_white(janelas, intervalo_confianca, self.LAMBDA)
+        }
+        return DataFrame({
+            Colunas.DATA.value: datas,
+            **{tipo.name: reducoes[tipo]() for tipo in tipos}
+        })
+
+    def _var_janela_ordenada(
+            self,
+            cubo: CuboCenarios,
+            datas: ndarray,
+            n_cenarios: int,
+            intervalo_confianca: IntervaloConfianca,
+            tipos: tuple[TipoVarHistorico, ...]
+    ) -> dict[str, ndarray]:
+        # Avançar a janela data a data, consultando apenas os quantis dos tipos pedidos
+        historico = cubo.pnl_carteira()[::-1]
+        fins = cubo.datas[::-1].searchsorted(datas, side="left")
+        janela = JanelaOrdenada(historico, n_cenarios, self.LAMBDA)
+        percentil = self._percentil(intervalo_confianca)
+        consultas = {
+            TipoVarHistorico.SIMPLES: janela.quantil,
+            TipoVarHistorico.BOUDOUKH: janela.quantil_ponderado
+        }
+
+        resultado = {tipo.name: full(len(datas), nan) for tipo in tipos}
+        for i, fim_janela in enumerate(fins):
+            janela.mover_para(int(fim_janela))
+            if len(janela):
+                for tipo in tipos:
+                    resultado[tipo.name][i] = abs(consultas[tipo](percentil))
+        return resultado
+
+    def _nocionais_referencia(self, posicoes: list, datas: ndarray) -> ndarray:
+        # Nocional de cada posição (datas × posições) ao qual o PnL dos cenários é proporcional
+        mercado = self.inputs.mercado()
+        datas = atleast_1d(datas)
+        colunas = []
+        for posicao in posicoes:
+            if isinstance(posicao.ativo, (AcoesBr, AcoesUs)):
+                precos = mercado.acoes_br if posicao.localidade == Localidade.BR else mercado.acoes_us
+                moeda = mercado.fx.MOEDA_LOCAL if posicao.localidade == Localidade.BR else mercado.fx.DOLAR
+                colunas.append(precos.asof(datas, posicao.ativo.value) * mercado.fx.reais_por_unidade(moeda, datas))
+            elif isinstance(posicao.ativo, Futuros) and posicao.produto == TipoFuturo.IBOV:
+                colunas.append(mercado.acoes_br.asof(datas, posicao.produto.value))
+            elif isinstance(posicao.ativo, Futuros) and posicao.produto != TipoFuturo.DI:
+                colunas.append(mercado.fx.reais_por_unidade(posicao.instrumento.moeda, datas))
+            elif isinstance(posicao.ativo, Titulos) and posicao.localidade == Localidade.US:
+                colunas.append(mercado.fx.reais_por_unidade(mercado.fx.DOLAR, datas))
+            else:
+                colunas.append(ones(len(datas)))
+
+        return stack(colunas, axis=1)
+
+    @classmethod
+    def _var_janelas_simples(cls, janelas: ndarray, intervalo_confianca: IntervaloConfianca) -> ndarray:
+        return abs(nanquantile(janelas, cls._percentil(intervalo_confianca), axis=1))
+
+    @classmethod
+    def _var_janelas_boudoukh(cls, janelas: ndarray, intervalo_confianca: IntervaloConfianca, lambda_: float) -> ndarray:
+        # Pesos decrescentes a partir do cenário mais recente (último da janela), normalizados nos cenários válidos
+        n_cenarios = janelas.shape[1]
+        validos = ~isnan(janelas)
+        pesos = where(validos, (1 - lambda_) * lambda_ ** arange(n_cenarios - 1, -1, -1), 0.0)
+        pesos = pesos / pesos.sum(axis=1, keepdims=True)
+
+        # Menor PnL cujo peso acumulado, em ordem crescente de PnL, atinge o percentil
+        ordem = argsort(where(validos, janelas, inf), axis=1, kind="stable")
+        acumulado = take_along_axis(pesos, ordem, axis=1).cumsum(axis=1)
+        indice = (acumulado >= cls._percentil(intervalo_confianca)).argmax(axis=1)
+        return abs(take_along_axis(janelas, take_along_axis(ordem, indice[:, None], axis=1), axis=1)[:, 0])
+
+    @classmethod
+    def _var_janelas_hull_white(cls, janelas: ndarray, intervalo_confianca: IntervaloConfianca, lambda_: float) -> ndarray:
+        # Variação percentual do PnL dentro de cada janela, nula no primeiro cenário e em divisões por zero
+        with errstate(divide="ignore", invalid="ignore"):
+            variacoes = janelas[:, 1:] / janelas[:, :-1] - 1
+        variacoes = concatenate([zeros((len(janelas), 1)), variacoes], axis=1)
+        variacoes[isnan(variacoes) | isinf(variacoes)] = 0
+        variacoes[isnan(janelas)] = nan
+
+        # Volatilidade EWMA de todas as janelas simultaneamente (cenários × janelas)
+        volatilidades = sqrt_vetor(CalculosFatoresRisco.ewma_matricial(pow(variacoes, 2).T, lambda_)).T
+        with errstate(divide="ignore", invalid="ignore"):
+            z_valor = nanquantile(variacoes / volatilidades, cls._percentil(intervalo_confianca), axis=1)
+
+        return abs(z_valor * nanstd(janelas, axis=1, ddof=1))
 
-    pval_uc = 1 - chi2.cdf(LR_uc, df=1)
+    @staticmethod
+    def _percentil(intervalo_confianca: IntervaloConfianca) -> float:
+        return 1 - int(intervalo_confianca.name.split("P")[1])/100
 
-    # Teste de Christoffersen (Independência)
-    n00 = n01 = n10 = n11 = 0
-    for i in range(1, N):
-        prev, curr = violacoes[i - 1], violacoes[i]
-        if prev == 0 and curr == 0:
-            n00 += 1
-        elif prev == 0 and curr == 1:
-            n01 += 1
-        elif prev == 1 and curr == 0:
-            n10 += 1
-        elif prev == 1 and curr == 1:
-            n11 += 1
 
-    total_0 = n00 + n01
-    total_1 = n10 + n11
-    total = total_0 + total_1
+def backtest_var(violacoes: list[bool], nivel_confianca: float) -> dict:
+    resultado = backtest_var_lote(array([violacoes], dtype=float), nivel_confianca).iloc[0]
+    return {
+        "violacoes": int(resultado["violacoes"]),
+        "total": int(resultado["total"]),
+        **{coluna: float(resultado[coluna]) for coluna in COLUNAS_BACKTEST[2:]}
+    }
 
-    if total_0 == 0 or total_1 == 0:
-        LR_ind = 0
-    else:
-        pi_01 = n01 / total_0 if total_0 > 0 else 0
-        pi_11 = n11 / total_1 if total_1 > 0 else 0
-        pi_hat = (n01 + n11) / total if total > 0 else 0
 
-        L0 = ((1 - pi_hat) ** (n00 + n10)) * (pi_hat ** (n01 + n11))
-        L1 = ((1 - pi_01) ** n00) * (pi_01 ** n01) * ((1 - pi_11) ** n10) * (pi_11 ** n11)
+COLUNAS_BACKTEST = [
+    "violacoes",
+    "total",
+    "violacoes_esperadas",
+    "Kupiec_LR",
+    "Kupiec_p",
+    "Christoffersen_LR",
+    "Christoffersen_p",
+    "LRcc",
+    "LRcc_p"
+]
+
+
+def matriz_violacoes(pnl: ndarray, var: ndarray) -> ndarray:
+    # Violações (séries × dias): PnL abaixo de -|VaR|; dias sem PnL ou sem VaR ficam como NaN
+    pnl = atleast_2d(asarray(pnl, dtype=float))
+    var = atleast_2d(asarray(var, dtype=float))
+    pnl, var = broadcast_arrays(pnl, var)
+    return where(isnan(pnl) | isnan(var), nan, (pnl < -abs(var)).astype(float))
+
+
+def backtest_var_lote(
+        violacoes: Union[ndarray, DataFrame],
+        nivel_confianca: Union[float, ndarray],
+        nomes: Optional[list] = None
+) -> DataFrame:
+    # Kupiec, Christoffersen e LRcc para várias séries de violações (séries × dias), uma linha por série
+    if isinstance(violacoes, DataFrame):
+        nomes = violacoes.index.to_list() if nomes is None else nomes
+        violacoes = violacoes.to_numpy(dtype=float)
+    violacoes = atleast_2d(asarray(violacoes, dtype=float))
+    validos = ~isnan(violacoes)
+    v = where(validos, violacoes, 0)
+
+    N = validos.sum(axis=1)
+    x = v.sum(axis=1)
+    p = 1 - broadcast_to(asarray(nivel_confianca, dtype=float), N.shape)
+    with errstate(divide="ignore", invalid="ignore"):
+        p_hat = x / N
+
+        # Teste de Kupiec (Cobertura Incondicional), nulo quando não há ou só há violações
+        LR_uc = -2 * (
+            xlogy(N - x, 1 - p) + xlogy(x, p) - xlogy(N - x, 1 - p_hat) - xlogy(x, p_hat)
+        )
+    LR_uc = where((x == 0) | (x == N), 0.0, LR_uc)
+    pval_uc = 1 - chi2.cdf(LR_uc, df=1)
 
-        LR_ind = -2 * log(L0 / L1) if L0 > 0 and L1 > 0 else 0
+    # Teste de Christoffersen (Independência): contagem de transições entre dias consecutivos válidos
+    pares = validos[:, :-1] & validos[:, 1:]
+    anterior, atual = v[:, :-1], v[:, 1:]
+    n00 = (pares & (anterior == 0) & (atual == 0)).sum(axis=1)
+    n01 = (pares & (anterior == 0) & (atual == 1)).sum(axis=1)
+    n10 = (pares & (anterior == 1) & (atual == 0)).sum(axis=1)
+    n11 = (pares & (anterior == 1) & (atual == 1)).sum(axis=1)
 
+    total_0 = n00 + n01
+    total_1 = n10 + n11
+    with errstate(divide="ignore", invalid="ignore"):
+        pi_01 = n01 / total_0
+        pi_11 = n11 / total_1
+        pi_hat = (n01 + n11) / (total_0 + total_1)
+
+        log_L0 = xlogy(n00 + n10, 1 - pi_hat) + xlogy(n01 + n11, pi_hat)
+        log_L1 = xlogy(n00, 1 - pi_01) + xlogy(n01, pi_01) + xlogy(n10, 1 - pi_11) + xlogy(n11, pi_11)
+    LR_ind = where((total_0 == 0) | (total_1 == 0), 0.0, -2 * (log_L0 - log_L1))
     pval_ind = 1 - chi2.cdf(LR_ind, df=1)
 
     # Teste conjunto (LRcc)
     LR_cc = LR_uc + LR_ind
     pval_cc = 1 - chi2.cdf(LR_cc, df=2)
 
-    return {
-        "violacoes": int(x),
+    return DataFrame({
+        "violacoes": x.astype(int),
         "total": N,
-        "violacoes_esperadas": round(p * N, 2),
-        "Kupiec_LR": round(LR_uc, 4),
-        "Kupiec_p": round(pval_uc, 4),
-        "Christoffersen_LR": round(LR_ind, 4),
-        "Christoffersen_p": round(pval_ind, 4),
-        "LRcc": round(LR_cc, 4),
-        "LRcc_p": round(pval_cc, 4)
-    }
+        "violacoes_esperadas": (p * N).round(2),
+        "Kupiec_LR": LR_uc.round(4),
+        "Kupiec_p": pval_uc.round(4),
+        "Christoffersen_LR": LR_ind.round(4),
+        "Christoffersen_p": pval_ind.round(4),
+        "LRcc": LR_cc.round(4),
+        "LRcc_p": pval_cc.round(4)
+    }, index=nomes)
@@ -0,0 +1,73 @@
+import os
+from typing import Callable
+
+from pandas import DataFrame, Series
+
+
+class CacheInputs:
+    """
+    Cache em memória das tabelas de inputs, por versão da planilha, com colunas somente leitura.
+    """
+    def __init__(self):
+        self._tabelas: dict[tuple[str, str], DataFrame] = {}
+        self._versoes: dict[str, tuple[int, int]] = {}
+        self.acertos = 0
+        self.falhas = 0
+
+    @staticmethod
+    def versao(caminho: str) -> tuple[int, int]:
+        stat = os.stat(caminho)
+        return stat.st_mtime_ns, stat.st_size
+
+    def obter(self, caminho: str, tabela: str, leitor: Callable[[], DataFrame]) -> DataFrame:
+        self._validar(caminho)
+
+        chave = (caminho, tabela)
+        if chave in self._tabelas:
+            self.acertos += 1
+            return self._tabelas[chave].copy(deep=False)
+
+        self.falhas += 1
+        return self.registrar(caminho, tabela, leitor())
+
+    def registrar(self, caminho: str, tabela: str, df: DataFrame) -> DataFrame:
+        self._validar(caminho)
+        self._tabelas[(caminho, tabela)] = self._somente_leitura(df)
+        return self._tabelas[(caminho, tabela)].copy(deep=False)
+
+    def estatisticas(self) -> dict:
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "tabelas": len(self._tabelas)
+        }
+
+    def limpar(self) -> None:
+        self._tabelas.clear()
+        self._versoes.clear()
+        self.acertos = 0
+        self.falhas = 0
+
+    def _validar(self, caminho: str) -> None:
+        # Descartar tabelas da planilha caso o arquivo tenha sido modificado
+        versao = self.versao(caminho)
+        if self._versoes.get(caminho) == versao:
+            return None
+
+        for chave in [c for c in self._tabelas if c[0] == caminho]:
+            del self._tabelas[chave]
+        self._versoes[caminho] = versao
+
+    @staticmethod
+    def _somente_leitura(df: DataFrame) -> DataFrame:
+        colunas = {}
+        for coluna in df.columns:
+            valores = df[coluna].to_numpy()
+
+            # Colunas já protegidas (ex.: mapeadas do snapshot) não precisam ser copiadas
+            if valores.flags.writeable:
+                valores = valores.copy()
+                valores.setflags(write=False)
+            colunas[coluna] = Series(valores, index=df.index, dtype=valores.dtype, copy=False)
+
+        return DataFrame(colunas, copy=False)
@@ -0,0 +1,67 @@
+from datetime import date
+from typing import Union
+
+from numpy import arange, asarray, busday_count, busday_offset, busdaycalendar, cumsum, datetime64, int64, is_busday, \
+                  ndarray, unique, where
+from pandas import DataFrame, to_datetime
+
+from utils.enums import Colunas
+
+
+class CalendarioDiasUteis:
+    """
+    Calendário de dias úteis brasileiro, com contagem acumulada de dias úteis por dia corrido.
+    """
+    def __init__(self, feriados: DataFrame):
+        datas_feriados = to_datetime(feriados[Colunas.DATA.value], errors="coerce").dropna()
+        self.feriados = unique(datas_feriados.to_numpy(dtype="datetime64[D]"))
+        self._calendario = busdaycalendar(holidays=self.feriados)
+
+        # Cobrir anos completos do primeiro ao último feriado
+        self.inicio = datetime64(f"{self.feriados.min().astype(object).year}-01-01", "D")
+        self.fim = datetime64(f"{self.feriados.max().astype(object).year}-12-31", "D")
+
+        self.dias_uteis = is_busday(arange(self.inicio, self.fim + 1), busdaycal=self._calendario)
+        self.acumulado = cumsum(self.dias_uteis, dtype=int64)
+
+    def eh_dia_util(self, datas: Union[date, list[date], ndarray]) -> Union[bool, ndarray]:
+        datas = self._datas(datas)
+        resultado = is_busday(datas, busdaycal=self._calendario)
+        return bool(resultado) if resultado.ndim == 0 else resultado
+
+    def du(
+            self,
+            data_referencia: Union[date, list[date], ndarray],
+            vencimento: Union[date, list[date], ndarray]
+    ) -> Union[int, ndarray]:
+        # Dias úteis em [data_referencia, vencimento] menos um, como em RendaFixa.calcular_du; aceita arrays de datas
+        inicio = self._datas(data_referencia)
+        fim = self._datas(vencimento)
+
+        # Dias úteis em [inicio, fim] = acumulado(fim) - acumulado(inicio) + (inicio é dia útil)
+        contagem = self._acumulado(fim) - self._acumulado(inicio) + is_busday(inicio, busdaycal=self._calendario)
+        resultado = where(fim < inicio, -1, contagem - 1)
+        return int(resultado) if resultado.ndim == 0 else resultado
+
+    def somar(self, datas: Union[date, list[date], ndarray], dias_uteis: Union[int, ndarray]) -> ndarray:
+        # Data que está `dias_uteis` dias úteis após (ou antes, se negativo) cada data, partindo do dia útil seguinte
+        return busday_offset(self._datas(datas), dias_uteis, roll="forward", busdaycal=self._calendario)
+
+    def rolar(self, datas: Union[date, list[date], ndarray], seguinte: bool = True) -> ndarray:
+        # Ajustar datas não úteis para o dia útil seguinte (ou anterior)
+        return busday_offset(self._datas(datas), 0, roll="forward" if seguinte else "backward", busdaycal=self._calendario)
+
+    def _acumulado(self, datas: ndarray) -> ndarray:
+        # Quantidade de dias úteis desde o início do calendário até cada data, inclusive
+        n = len(self.acumulado)
+        i = (datas - self.inicio).astype(int64)
+        acumulado = self.acumulado[i.clip(0, n - 1)]
+
+        # Datas fora do intervalo coberto: estender contagem considerando apenas finais de semana
+        acumulado = where(i >= n, acumulado + busday_count(self.fim + 1, datas + 1), acumulado)
+        acumulado = where(i < 0, -busday_count(datas + 1, self.inicio), acumulado)
+        return acumulado
+
+    @staticmethod
+    def _datas(datas: Union[date, list[date], ndarray]) -> ndarray:
+        return asarray(to_datetime(datas), dtype="datetime64[D]")
@@ -1,5 +1,13 @@
+from typing import Optional
+
 from pandas import DataFrame, read_excel
 
+from inputs.cache import CacheInputs
+from inputs.calendario import CalendarioDiasUteis
+from inputs.ingestao import IngestaoPlanilha
+from inputs.instrumentos import RegistroInstrumentos
+from inputs.mercado import BaseMercado
+from inputs.snapshot import SnapshotInputs
 from utils.enums import Colunas
 from utils.formatters import to_snake_case
 
@@ -7,26 +15,173 @@ from utils.formatters import to_snake_case
 class InputsDataHandler:
     _INPUTS_PATH = "dados\Dados trabalho 2025.xlsx"
 
+    # Parâmetros de leitura de cada tabela na planilha
+    _LEITURAS = {
+        "feriados": {"sheet_name": "Feriados Brasil"},
+        "acoes_br": {"sheet_name": "Acoes BZ e IBOV"},
+        "acoes_us": {"sheet_name": "Acoes US"},
+        "juros_nominal_br": {"sheet_name": "Juros nominal Brasil", "skiprows": 1},
+        "juros_real_br": {"sheet_name": "Juros Real Brasil", "skiprows": 1},
+        "di": {"sheet_name": "DI", "skiprows": 1},
+        "treasury": {"sheet_name": "Treasury"},
+        "fx": {"sheet_name": "fx", "skiprows": 1},
+        "opcoes": {"sheet_name": "Dados Carteiras", "skiprows": 40, "usecols": "B:H", "nrows": 15},
+        "titulos": {"sheet_name": "Dados Carteiras", "skiprows": 58, "usecols": "B:G", "nrows": 11},
+        "futuros": {"sheet_name": "Dados Carteiras", "skiprows": 72, "usecols": "B:F", "nrows": 27},
+    }
+    _TABELAS = tuple(_LEITURAS)
+
+    _CACHE = CacheInputs()
+
+    def __init__(self, usar_snapshot: bool = False, usar_cache: bool = True):
+        # Com snapshot, as tabelas são lidas de arquivos colunares mapeados em memória ao invés do Excel
+        self.usar_snapshot = usar_snapshot
+        self.usar_cache = usar_cache
+        self.tempos_ingestao: dict[str, float] = {}
+        self._snapshot: Optional[SnapshotInputs] = None
+        self._versao_snapshot: Optional[tuple[int, int]] = None
+        self._mercado: Optional[BaseMercado] = None
+        self._versao_mercado: Optional[tuple[int, int]] = None
+        self._instrumentos: Optional[RegistroInstrumentos] = None
+        self._versao_instrumentos: Optional[tuple[int, int]] = None
+        self._calendario: Optional[CalendarioDiasUteis] = None
+        self._versao_calendario: Optional[tuple[int, int]] = None
+
     def feriados(self) -> DataFrame:
-        df = read_excel(self._INPUTS_PATH, sheet_name="Feriados Brasil").dropna(subset="Feriado")
+        return self._carregar("feriados")
+
+    def acoes_br(self) -> DataFrame:
+        return self._carregar("acoes_br")
+
+    def acoes_us(self) -> DataFrame:
+        return self._carregar("acoes_us")
+
+    def juros_nominal_br(self) -> DataFrame:
+        return self._carregar("juros_nominal_br")
+
+    def juros_real_br(self) -> DataFrame:
+        return self._carregar("juros_real_br")
+
+    def di(self) -> DataFrame:
+        return self._carregar("di")
+
+    def treasury(self) -> DataFrame:
+        return self._carregar("treasury")
+
+    def fx(self) -> DataFrame:
+        return self._carregar("fx")
+
+    def opcoes(self) -> DataFrame:
+        return self._carregar("opcoes")
+
+    def titulos(self) -> DataFrame:
+        return self._carregar("titulos")
+
+    def futuros(self) -> DataFrame:
+        return self._carregar("futuros")
+
+    def versao(self) -> tuple[int, int]:
+        # Versão dos dados de mercado, identificada pela data de modificação e tamanho da planilha
+        return CacheInputs.versao(self._INPUTS_PATH)
+
+    def mercado(self) -> BaseMercado:
+        # Construir base indexada de preços, câmbio e curvas uma única vez por versão da planilha
+        versao = self.versao()
+        if self._mercado is None or self._versao_mercado != versao:
+            self._mercado = BaseMercado(self.acoes_br(), self.acoes_us(), self.fx(), self.di(), self.treasury())
+            self._versao_mercado = versao
+
+        return self._mercado
+
+    def calendario(self) -> CalendarioDiasUteis:
+        # Construir calendário de dias úteis uma única vez por versão da planilha
+        versao = self.versao()
+        if self._calendario is None or self._versao_calendario != versao:
+            self._calendario = CalendarioDiasUteis(self.feriados())
+            self._versao_calendario = versao
+
+        return self._calendario
+
+    def instrumentos(self) -> RegistroInstrumentos:
+        # Construir cadastro de opções, títulos e futuros uma única vez por versão da planilha
+        versao = self.versao()
+        if self._instrumentos is None or self._versao_instrumentos != versao:
+            self._instrumentos = RegistroInstrumentos(self.opcoes(), self.titulos(), self.futuros())
+            self._versao_instrumentos = versao
+
+        return self._instrumentos
+
+    def carregar_tabelas(self, max_workers: Optional[int] = None) -> dict[str, DataFrame]:
+        # Abrir a planilha uma única vez e decodificar todas as abas, registrando o tempo gasto em cada uma
+        ingestao = IngestaoPlanilha(self._INPUTS_PATH, max_workers)
+        tabelas = {
+            tabela: getattr(self, f"_processar_{tabela}")(df)
+            for tabela, df in ingestao.ler(self._LEITURAS).items()
+        }
+        self.tempos_ingestao = ingestao.tempos
+
+        # Aproveitar leitura para popular o cache
+        if self.usar_cache and not self.usar_snapshot:
+            return {
+                tabela: self._CACHE.registrar(self._INPUTS_PATH, tabela, df)
+                for tabela, df in tabelas.items()
+            }
+
+        return tabelas
+
+    def gerar_snapshot(self) -> str:
+        # Converter todas as tabelas da planilha para o formato colunar
+        return SnapshotInputs(self._INPUTS_PATH).gerar(self.carregar_tabelas())
+
+    def estatisticas_cache(self) -> dict:
+        return self._CACHE.estatisticas()
+
+    def _carregar(self, tabela: str) -> DataFrame:
+        leitor = (
+            (lambda: self._ler_snapshot(tabela))
+            if self.usar_snapshot
+            else
+            (lambda: self._ler_excel(tabela))
+        )
+        if not self.usar_cache:
+            return leitor()
+
+        return self._CACHE.obter(self._INPUTS_PATH, tabela, leitor)
+
+    def _ler_excel(self, tabela: str) -> DataFrame:
+        df = read_excel(self._INPUTS_PATH, **self._LEITURAS[tabela])
+        return getattr(self, f"_processar_{tabela}")(df)
+
+    def _ler_snapshot(self, tabela: str) -> DataFrame:
+        # Abrir snapshot uma única vez por versão da planilha, gerando-o caso ela tenha mudado desde a última conversão
+        versao = self.versao()
+        if self._snapshot is None or self._versao_snapshot != versao:
+            snapshot = SnapshotInputs(self._INPUTS_PATH)
+            if not snapshot.existe:
+                self.gerar_snapshot()
+            self._snapshot = snapshot.abrir()
+            self._versao_snapshot = versao
+
+        return self._snapshot.tabela(tabela)
+
+    def _processar_feriados(self, df: DataFrame) -> DataFrame:
+        df = df.dropna(subset="Feriado")
         df.columns = [to_snake_case(col) for col in df.columns]
 
         return df
 
-    def acoes_br(self) -> DataFrame:
+    def _processar_acoes_br(self, df: DataFrame) -> DataFrame:
         # Ler e processar informações
         return (
-            read_excel(self._INPUTS_PATH, sheet_name="Acoes BZ e IBOV")
-            .rename(columns={"Unnamed: 0": Colunas.DATA.value})
-            .melt(id_vars=Colunas.DATA.value, var_name=Colunas.ATIVO.value, value_name=Colunas.PRECO.value)
+            df.rename(columns={"Unnamed: 0": Colunas.DATA.value})
+              .melt(id_vars=Colunas.DATA.value, var_name=Colunas.ATIVO.value, value_name=Colunas.PRECO.value)
         )
 
-    def acoes_us(self) -> DataFrame:
+    def _processar_acoes_us(self, df: DataFrame) -> DataFrame:
         # Ler e processar dados
         df = (
-            read_excel(self._INPUTS_PATH, sheet_name="Acoes US")
-            .rename(columns={"Unnamed: 0": Colunas.DATA.value})
-            .melt(id_vars=Colunas.DATA.value, var_name=Colunas.ATIVO.value, value_name=Colunas.PRECO.value)
+            df.rename(columns={"Unnamed: 0": Colunas.DATA.value})
+              .melt(id_vars=Colunas.DATA.value, var_name=Colunas.ATIVO.value, value_name=Colunas.PRECO.value)
         )
 
         # Limpar nomes dos ativos
@@ -35,43 +190,38 @@ class InputsDataHandler:
         # Realizar cálculo de retorno diário dos ativos
         return df
 
-    def juros_nominal_br(self) -> DataFrame:
+    def _processar_juros_nominal_br(self, df: DataFrame) -> DataFrame:
         return (
-            read_excel(self._INPUTS_PATH, sheet_name="Juros nominal Brasil", skiprows=1)
-            .rename(columns={"Unnamed: 0": Colunas.DATA.value})
-            .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
+            df.rename(columns={"Unnamed: 0": Colunas.DATA.value})
+              .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
         )
 
-    def juros_real_br(self) -> DataFrame:
+    def _processar_juros_real_br(self, df: DataFrame) -> DataFrame:
         return (
-            read_excel(self._INPUTS_PATH, sheet_name="Juros Real Brasil", skiprows=1)
-            .rename(columns={"Unnamed: 0": Colunas.DATA.value})
-            .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
+            df.rename(columns={"Unnamed: 0": Colunas.DATA.value})
+              .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
         )
 
-    def di(self) -> DataFrame:
+    def _processar_di(self, df: DataFrame) -> DataFrame:
         return (
-            read_excel(self._INPUTS_PATH, sheet_name="DI", skiprows=1)
-            .rename(columns={"Unnamed: 0": Colunas.DATA.value})
-            .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
+            df.rename(columns={"Unnamed: 0": Colunas.DATA.value})
+              .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
         )
 
-    def treasury(self) -> DataFrame:
+    def _processar_treasury(self, df: DataFrame) -> DataFrame:
         df = (
-            read_excel(self._INPUTS_PATH, sheet_name="Treasury")
-            .rename(columns={"Unnamed: 0": Colunas.DATA.value})
-            .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
+            df.rename(columns={"Unnamed: 0": Colunas.DATA.value})
+              .melt(id_vars=Colunas.DATA.value, var_name=Colunas.PRAZO.value, value_name=Colunas.VALOR.value)
         )
         df[Colunas.PRAZO.value] = df[Colunas.PRAZO.value].str.replace("Treasury ", "")
 
         return df
 
-    def fx(self) -> DataFrame:
+    def _processar_fx(self, df: DataFrame) -> DataFrame:
         # Ler e processar informações
         df = (
-            read_excel(self._INPUTS_PATH, sheet_name="fx", skiprows=1)
-            .rename(columns={"Unnamed: 0": Colunas.DATA.value})
-            .melt(id_vars=Colunas.DATA.value, var_name=Colunas.CAMBIO.value, value_name=Colunas.VALOR.value)
+            df.rename(columns={"Unnamed: 0": Colunas.DATA.value})
+              .melt(id_vars=Colunas.DATA.value, var_name=Colunas.CAMBIO.value, value_name=Colunas.VALOR.value)
         )
 
         # Limpar valores da coluna de identificação de produtos
@@ -80,12 +230,9 @@ class InputsDataHandler:
         # Calcular variação diária dos produtos
         return df
     
-    def opcoes(self) -> DataFrame:
-        # Ler Excel
-        df = (
-            read_excel(self._INPUTS_PATH, sheet_name="Dados Carteiras", skiprows=40, usecols="B:H", nrows=15)
-            .rename(columns={"Unnamed: 1": Colunas.ID.value})
-        )
+    def _processar_opcoes(self, df: DataFrame) -> DataFrame:
+        # Identificar coluna de IDs
+        df = df.rename(columns={"Unnamed: 1": Colunas.ID.value})
 
         # Ajustar nomes das colunas
         df.columns = [to_snake_case(col) for col in df.columns]
@@ -98,12 +245,9 @@ class InputsDataHandler:
 
         return df
 
-    def titulos(self) -> DataFrame:
-        # Ler Excel
-        df = (
-            read_excel(self._INPUTS_PATH, sheet_name="Dados Carteiras", skiprows=58, usecols="B:G", nrows=11)
-            .rename(columns={"Título": Colunas.ID.value})
-        )
+    def _processar_titulos(self, df: DataFrame) -> DataFrame:
+        # Identificar coluna de IDs
+        df = df.rename(columns={"Título": Colunas.ID.value})
 
         # Ajustar nomes das colunas
         df.columns = [to_snake_case(col) for col in df.columns]
@@ -116,12 +260,9 @@ class InputsDataHandler:
 
         return df
 
-    def futuros(self) -> DataFrame:
-        # Ler Excel
-        df = (
-            read_excel(self._INPUTS_PATH, sheet_name="Dados Carteiras", skiprows=72, usecols="B:F", nrows=27)
-            .rename(columns={"Unnamed: 1": Colunas.ID.value})
-        )
+    def _processar_futuros(self, df: DataFrame) -> DataFrame:
+        # Identificar coluna de IDs
+        df = df.rename(columns={"Unnamed: 1": Colunas.ID.value})
 
         # Ajustar nomes das colunas
         df.columns = [to_snake_case(col) for col in df.columns]
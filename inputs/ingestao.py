@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from time import perf_counter
+from typing import Optional
+
+from openpyxl.utils import column_index_from_string
+from pandas import DataFrame, ExcelFile, isna
+
+
+class IngestaoPlanilha:
+    """
+    Leitura de todas as tabelas da planilha de inputs em uma única passada.
+    """
+    def __init__(self, caminho_planilha: str, max_workers: Optional[int] = None):
+        self.caminho_planilha = caminho_planilha
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.tempos: dict[str, float] = {}
+
+    def ler(self, leituras: dict[str, dict]) -> dict[str, DataFrame]:
+        inicio = perf_counter()
+        with open(self.caminho_planilha, "rb") as arquivo:
+            conteudo = arquivo.read()
+
+        # Agrupar tabelas por aba, para que cada aba seja decodificada uma única vez
+        abas: dict[str, dict[str, dict]] = {}
+        for tabela, parametros in leituras.items():
+            parametros = dict(parametros)
+            abas.setdefault(parametros.pop("sheet_name"), {})[tabela] = parametros
+
+        # Distribuir abas entre os workers
+        n_workers = min(self.max_workers, len(abas))
+        lotes = [dict(list(abas.items())[i::n_workers]) for i in range(n_workers)]
+        if n_workers == 1:
+            resultados = [_decodificar_abas(conteudo, lotes[0])]
+        else:
+            with ProcessPoolExecutor(n_workers) as executor:
+                resultados = list(executor.map(_decodificar_abas, [conteudo] * n_workers, lotes))
+
+        tabelas = {}
+        for tabelas_lote, tempos_lote in resultados:
+            tabelas.update(tabelas_lote)
+            self.tempos.update(tempos_lote)
+        self.tempos["total"] = perf_counter() - inicio
+
+        # Manter a ordem original das tabelas
+        return {tabela: tabelas[tabela] for tabela in leituras}
+
+
+def _decodificar_abas(conteudo: bytes, abas: dict[str, dict[str, dict]]) -> tuple[dict[str, DataFrame], dict[str, float]]:
+    planilha = ExcelFile(BytesIO(conteudo))
+
+    tabelas, tempos = {}, {}
+    for aba, leituras in abas.items():
+        inicio = perf_counter()
+        if len(leituras) == 1:
+            # Aba com uma única tabela: ler diretamente com os mesmos parâmetros do read_excel
+            tabela, parametros = next(iter(leituras.items()))
+            tabelas[tabela] = planilha.parse(aba, **parametros)
+        else:
+            # Aba com várias tabelas: ler a grade bruta uma única vez e recortar cada bloco
+            grade = planilha.parse(aba, header=None)
+            for tabela, parametros in leituras.items():
+                tabelas[tabela] = _recortar_tabela(grade, **parametros)
+        tempos[aba] = perf_counter() - inicio
+
+    return tabelas, tempos
+
+
+def _recortar_tabela(
+        grade: DataFrame,
+        skiprows: int = 0,
+        usecols: Optional[str] = None,
+        nrows: Optional[int] = None
+) -> DataFrame:
+    # Converter intervalo de colunas no formato Excel (ex.: "B:H") em posições
+    if usecols is None:
+        colunas = list(range(grade.shape[1]))
+    else:
+        inicio, fim = usecols.split(":")
+        colunas = list(range(column_index_from_string(inicio) - 1, column_index_from_string(fim)))
+
+    # Selecionar cabeçalho e linhas, descartando linhas vazias ao final como faz o read_excel
+    linhas = grade.iloc[skiprows:None if nrows is None else skiprows + 1 + nrows]
+    linhas = linhas.iloc[:linhas.notna().any(axis=1).to_numpy().nonzero()[0].max() + 1]
+    bloco = linhas.iloc[:, colunas]
+
+    cabecalho = [f"Unnamed: {c}" if isna(nome) else nome for c, nome in zip(colunas, bloco.iloc[0])]
+    return DataFrame(bloco.iloc[1:].to_numpy(), columns=cabecalho).infer_objects()
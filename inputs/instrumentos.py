@@ -0,0 +1,143 @@
+from typing import Optional, Union
+
+from pandas import DataFrame
+
+from utils.enums import Colunas, AcoesBr, AcoesUs, Opcoes, Titulos, Futuros, TipoFuturo, TipoTitulo, ProdutosOpcoes, \
+                        FatoresRisco, Localidade, definir_tipo_futuro, definir_produto_opcao, definir_tipo_titulo
+
+
+class Instrumento:
+    """
+    Características cadastrais de um instrumento da carteira, com localidade e fatores de risco já resolvidos.
+    """
+    def __init__(
+            self,
+            ativo: Union[AcoesBr, AcoesUs, Opcoes, Titulos, Futuros],
+            produto: Optional[Union[TipoFuturo, TipoTitulo, ProdutosOpcoes]] = None,
+            vencimento: Optional[object] = None,
+            cupom: Optional[float] = None,
+            taxa: Optional[float] = None,
+            tamanho_contrato: Optional[float] = None,
+            moeda: Optional[str] = None,
+            strike: Optional[float] = None,
+            nocional: Optional[float] = None,
+            tipo_opcao: Optional[str] = None,
+            preco: Optional[float] = None
+    ):
+        self.ativo = ativo
+        self.produto = produto
+        self.vencimento = vencimento
+        self.cupom = cupom
+        self.taxa = taxa
+        self.tamanho_contrato = tamanho_contrato
+        self.moeda = moeda
+        self.strike = strike
+        self.nocional = nocional
+        self.tipo_opcao = tipo_opcao
+        self.preco = preco
+        self.localidade = definir_localidade(ativo, produto)
+        self.fatores_risco = definir_fatores_risco(ativo, produto, self.localidade)
+
+
+class RegistroInstrumentos:
+    """
+    Cadastro de opções, títulos e futuros, construído uma única vez a partir da aba "Dados Carteiras".
+    """
+    def __init__(self, opcoes: DataFrame, titulos: DataFrame, futuros: DataFrame):
+        self._instrumentos: dict = {}
+
+        colunas_opcoes = [Colunas.ID.value, "underlying", Colunas.VENCIMENTO.value, "strike", "nocional", Colunas.TIPO.value, Colunas.PRECO.value]
+        for id_ativo, underlying, vencimento, strike, nocional, tipo, preco in self._linhas(opcoes, colunas_opcoes):
+            if id_ativo in Opcoes._value2member_map_:
+                self._registrar(Instrumento(
+                    Opcoes(id_ativo),
+                    produto=definir_produto_opcao(underlying),
+                    vencimento=vencimento,
+                    strike=strike,
+                    nocional=nocional,
+                    tipo_opcao=tipo,
+                    preco=preco
+                ))
+
+        colunas_titulos = [Colunas.ID.value, Colunas.TIPO.value, Colunas.VENCIMENTO.value, "cupom", "taxa", Colunas.PRECO.value]
+        for id_ativo, tipo, vencimento, cupom, taxa, preco in self._linhas(titulos, colunas_titulos):
+            if id_ativo in Titulos._value2member_map_:
+                self._registrar(Instrumento(
+                    Titulos(id_ativo),
+                    produto=definir_tipo_titulo(tipo),
+                    vencimento=vencimento,
+                    cupom=cupom,
+                    taxa=taxa,
+                    preco=preco
+                ))
+
+        colunas_futuros = [Colunas.ID.value, Colunas.TIPO.value, Colunas.VENCIMENTO.value, "tamanho_contrato", "moeda", Colunas.PRECO.value]
+        for id_ativo, tipo, vencimento, tamanho_contrato, moeda, preco in self._linhas(futuros, colunas_futuros):
+            if id_ativo in Futuros._value2member_map_:
+                self._registrar(Instrumento(
+                    Futuros(id_ativo),
+                    produto=definir_tipo_futuro(tipo),
+                    vencimento=vencimento,
+                    tamanho_contrato=tamanho_contrato,
+                    moeda=moeda,
+                    preco=preco
+                ))
+
+    def obter(self, ativo: Union[AcoesBr, AcoesUs, Opcoes, Titulos, Futuros]) -> Instrumento:
+        if ativo not in self._instrumentos:
+            assert isinstance(ativo, (AcoesBr, AcoesUs)), f"Instrumento {ativo} não encontrado nos dados das carteiras."
+            self._registrar(Instrumento(ativo))
+        return self._instrumentos[ativo]
+
+    def listar(self, classe: type) -> list[Instrumento]:
+        # Instrumentos registrados de uma classe de ativo (ex.: Opcoes)
+        return [i for i in self._instrumentos.values() if isinstance(i.ativo, classe)]
+
+    def _registrar(self, instrumento: Instrumento) -> None:
+        self._instrumentos[instrumento.ativo] = instrumento
+
+    @staticmethod
+    def _linhas(df: DataFrame, colunas: list[str]) -> zip:
+        # Percorrer linhas preservando os tipos NumPy de cada coluna (ex.: datetime64 para vencimentos)
+        return zip(*(df[coluna].to_numpy() for coluna in colunas))
+
+
+def definir_localidade(
+        ativo: Union[AcoesBr, AcoesUs, Opcoes, Titulos, Futuros],
+        produto: Optional[Union[TipoFuturo, TipoTitulo, ProdutosOpcoes]]
+) -> Localidade:
+    if (not isinstance(ativo, AcoesUs)) and (not isinstance(ativo, Titulos)):
+        return Localidade.BR
+    elif isinstance(ativo, Titulos) and not produto == TipoTitulo.TREASURY:
+        return Localidade.BR
+    else:
+        return Localidade.US
+
+
+def definir_fatores_risco(
+        ativo: Union[AcoesBr, AcoesUs, Opcoes, Titulos, Futuros],
+        produto: Optional[Union[TipoFuturo, TipoTitulo, ProdutosOpcoes]],
+        localidade: Localidade
+) -> tuple[FatoresRisco]:
+    adicional_cambio = (FatoresRisco.CAMBIO_USDBRL,) if localidade == Localidade.US else ()
+    if isinstance(ativo, (AcoesBr, AcoesUs)):
+        fatores_risco = FatoresRisco.ACAO,
+    elif isinstance(ativo, Opcoes):
+        fatores_risco = FatoresRisco.ACAO, FatoresRisco.VOLATILIDADE
+    elif isinstance(ativo, Titulos):
+        fatores_risco = FatoresRisco.JUROS,
+    elif isinstance(ativo, Futuros):
+        if produto == TipoFuturo.USDBRL:
+            fatores_risco = FatoresRisco.CAMBIO_USDBRL,
+        elif produto in [TipoFuturo.EURUSD, TipoFuturo.USDCAD, TipoFuturo.USDJPY, TipoFuturo.USDMXN]:
+            fatores_risco = FatoresRisco.CAMBIO_USDOUTROS,
+        elif produto == TipoFuturo.DI:
+            fatores_risco = FatoresRisco.JUROS,
+        elif produto == TipoFuturo.IBOV:
+            fatores_risco = FatoresRisco.ACAO,
+        else:
+            raise ValueError("Fator de risco desconhecido para o respectivo ativo.")
+    else:
+        raise ValueError("Fator de risco desconhecido para o respectivo ativo.")
+
+    return tuple(set(fatores_risco + adicional_cambio))
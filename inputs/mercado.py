@@ -0,0 +1,225 @@
+from datetime import date
+from typing import Callable, Optional, Union
+
+from numpy import asarray, atleast_1d, errstate, isnan, nan, ndarray, ones_like, stack, where
+from pandas import DataFrame, Timestamp, to_datetime
+
+from utils.enums import Colunas
+
+
+class SerieMercado:
+    """
+    Série de mercado em formato denso (datas × instrumentos), com consultas as-of por busca binária.
+    """
+    def __init__(self, df: DataFrame, coluna_instrumento: Colunas, coluna_valor: Colunas):
+        tabela = (
+            df.dropna(subset=[Colunas.DATA.value])
+              .pivot(index=Colunas.DATA.value, columns=coluna_instrumento.value, values=coluna_valor.value)
+              .sort_index()
+        )
+        self.datas = tabela.index.to_numpy(dtype="datetime64[ns]")
+        self.instrumentos = tabela.columns.to_list()
+        self.valores = tabela.to_numpy(dtype=float)
+        self._colunas = {instrumento: j for j, instrumento in enumerate(self.instrumentos)}
+
+    def indices_asof(self, datas: Union[date, list[date], ndarray]) -> ndarray:
+        # Posição da última data disponível menor ou igual a cada data consultada (-1 se inexistente)
+        datas = asarray(to_datetime(datas), dtype="datetime64[ns]")
+        return self.datas.searchsorted(datas, side="right") - 1
+
+    def indices_instrumentos(self, instrumentos: Union[object, list]) -> ndarray:
+        if isinstance(instrumentos, (list, tuple, ndarray)):
+            return asarray([self._colunas[i] for i in instrumentos], dtype=int)
+        return asarray(self._colunas[instrumentos])
+
+    def asof(self, datas: Union[date, list[date], ndarray], instrumentos: Union[object, list]) -> Union[float, ndarray]:
+        i = self.indices_asof(datas)
+        j = self.indices_instrumentos(instrumentos)
+
+        # Combinar todas as datas com todos os instrumentos quando ambos forem vetores
+        linhas = i[:, None] if (i.ndim and j.ndim) else i
+        resultado = where(linhas >= 0, self.valores[linhas, j], nan)
+        return float(resultado) if resultado.ndim == 0 else resultado
+
+    def ultimo(self, instrumentos: Union[object, list]) -> Union[float, ndarray]:
+        # Valor na data mais recente da série
+        resultado = self.valores[-1, self.indices_instrumentos(instrumentos)]
+        return float(resultado) if resultado.ndim == 0 else resultado
+
+    def janela(
+            self,
+            inicio: Optional[date] = None,
+            fim: Optional[date] = None,
+            instrumentos: Optional[list] = None
+    ) -> DataFrame:
+        # Recortar intervalo de datas [inicio, fim] por busca binária
+        i_inicio = 0 if inicio is None else int(self.datas.searchsorted(Timestamp(inicio).to_datetime64(), side="left"))
+        i_fim = len(self.datas) if fim is None else int(self.datas.searchsorted(Timestamp(fim).to_datetime64(), side="right"))
+        instrumentos = self.instrumentos if instrumentos is None else list(instrumentos)
+
+        return DataFrame(
+            self.valores[i_inicio:i_fim][:, self.indices_instrumentos(instrumentos)],
+            index=self.datas[i_inicio:i_fim],
+            columns=instrumentos
+        ).rename_axis(Colunas.DATA.value)
+
+
+class CurvaJuros(SerieMercado):
+    """
+    Curva de juros em formato denso (datas × vértices), com interpolação linear ou flat-forward.
+    """
+    METODOS = ("linear", "flat_forward")
+
+    def __init__(self, df: DataFrame, prazos_por_ano: float, converter_prazo: Callable[[object], float]):
+        super().__init__(df, Colunas.PRAZO, Colunas.VALOR)
+
+        # Ordenar vértices pelo prazo numérico
+        prazos = asarray([converter_prazo(v) for v in self.instrumentos], dtype=float)
+        ordem = prazos.argsort(kind="stable")
+        self.instrumentos = [self.instrumentos[j] for j in ordem]
+        self.valores = self.valores[:, ordem]
+        self._colunas = {instrumento: j for j, instrumento in enumerate(self.instrumentos)}
+        self.prazos = prazos[ordem]
+        self.prazos_por_ano = prazos_por_ano
+
+    def vertice_mais_proximo(self, prazo: float) -> object:
+        return self.instrumentos[int(abs(self.prazos - prazo).argmin())]
+
+    def interpolar(
+            self,
+            prazos: Union[float, list[float], ndarray],
+            datas: Optional[Union[date, list[date], ndarray]] = None,
+            metodo: str = "linear"
+    ) -> ndarray:
+        # Taxas (datas × prazos) interpoladas; sem datas, todas as datas da curva, senão a última cotação até cada data
+        assert metodo in self.METODOS, f"Método de interpolação desconhecido: {metodo}."
+        prazos = atleast_1d(asarray(prazos, dtype=float))
+        if datas is None:
+            valores = self.valores
+        else:
+            i = atleast_1d(self.indices_asof(datas))
+            valores = where((i >= 0)[:, None], self.valores[i], nan)
+
+        inferior, superior, peso = self._vertices_interpolacao(prazos)
+        taxa_inferior = valores[:, inferior]
+        taxa_superior = valores[:, superior]
+
+        if metodo == "linear":
+            interpolado = taxa_inferior + peso * (taxa_superior - taxa_inferior)
+        else:
+            # Interpolar fatores de capitalização e reconverter para taxa anual
+            fator_inferior = pow(1 + taxa_inferior/100, self.prazos[inferior] / self.prazos_por_ano)
+            fator_superior = pow(1 + taxa_superior/100, self.prazos[superior] / self.prazos_por_ano)
+            fator = fator_inferior * pow(fator_superior / fator_inferior, peso)
+            interpolado = (pow(fator, self.prazos_por_ano / prazos) - 1) * 100
+
+        # Prazos coincidentes com vértices (ou fora do intervalo) utilizam diretamente a taxa do vértice
+        return where(peso == 0, taxa_inferior, where(peso == 1, taxa_superior, interpolado))
+
+    def serie(self, prazo: float, metodo: str = "linear") -> DataFrame:
+        # Histórico da taxa de um prazo, nas datas com cotação em algum dos vértices utilizados na interpolação
+        inferior, superior, _ = self._vertices_interpolacao(atleast_1d(asarray(prazo, dtype=float)))
+        cotado = ~(isnan(self.valores[:, inferior[0]]) & isnan(self.valores[:, superior[0]]))
+        return DataFrame({
+            Colunas.DATA.value: self.datas[cotado],
+            Colunas.PRAZO.value: prazo,
+            Colunas.VALOR.value: self.interpolar(prazo, metodo=metodo)[cotado, 0]
+        })
+
+    def _vertices_interpolacao(self, prazos: ndarray) -> tuple[ndarray, ndarray, ndarray]:
+        # Vértices imediatamente anterior e posterior a cada prazo e peso do posterior (0 a 1)
+        superior = self.prazos.searchsorted(prazos, side="left").clip(0, len(self.prazos) - 1)
+        inferior = where(self.prazos[superior] == prazos, superior, (superior - 1).clip(0, None))
+        with errstate(divide="ignore", invalid="ignore"):
+            peso = (prazos - self.prazos[inferior]) / (self.prazos[superior] - self.prazos[inferior])
+        peso = where(inferior == superior, where(prazos > self.prazos[superior], 1.0, 0.0), peso.clip(0, 1))
+        return inferior, superior, peso
+
+
+class SerieCambio(SerieMercado):
+    """
+    Paridades de moedas em formato denso (datas × pares), com triangulação para reais via USDBRL.
+    """
+    MOEDA_LOCAL = "BRL"
+    DOLAR = "USD"
+
+    def __init__(self, df: DataFrame):
+        super().__init__(df, Colunas.CAMBIO, Colunas.VALOR)
+        self.par_dolar = f"{self.DOLAR}{self.MOEDA_LOCAL}"
+
+        # Identificar, para cada moeda, o par cotado contra o dólar e se o dólar é a moeda base
+        self._pares: dict[str, tuple[str, bool]] = {}
+        for par in self.instrumentos:
+            base, cotada = par[:3], par[3:]
+            if base == self.DOLAR and cotada != self.MOEDA_LOCAL:
+                self._pares[cotada] = (par, True)
+            elif cotada == self.DOLAR:
+                self._pares[base] = (par, False)
+
+    def reais_por_unidade(
+            self,
+            moedas: Union[str, list[str]],
+            datas: Optional[Union[date, list[date], ndarray]] = None
+    ) -> Union[float, ndarray]:
+        # Reais por unidade de cada moeda (datas × moedas); sem datas, todas as datas da série
+        lista_moedas = [moedas] if isinstance(moedas, str) else list(moedas)
+        pares = [self.par_dolar] + [self._pares[m][0] for m in lista_moedas if m in self._pares]
+        if datas is None:
+            cotacoes = self.valores[:, self.indices_instrumentos(pares)]
+        else:
+            cotacoes = self.asof(atleast_1d(asarray(to_datetime(datas), dtype="datetime64[ns]")), pares)
+        dolar = cotacoes[:, 0]
+
+        # Triangular cada moeda estrangeira via dólar
+        colunas, k = [], 1
+        for moeda in lista_moedas:
+            if moeda == self.MOEDA_LOCAL:
+                colunas.append(ones_like(dolar))
+            elif moeda == self.DOLAR:
+                colunas.append(dolar)
+            else:
+                assert moeda in self._pares, f"Moeda {moeda} sem paridade contra o dólar."
+                colunas.append(dolar / cotacoes[:, k] if self._pares[moeda][1] else dolar * cotacoes[:, k])
+                k += 1
+        resultado = stack(colunas, axis=-1)
+
+        # Manter formato da consulta: escalar para uma moeda em uma data
+        if isinstance(moedas, str):
+            resultado = resultado[:, 0]
+        if datas is not None and asarray(to_datetime(datas)).ndim == 0:
+            resultado = resultado[0]
+        return float(resultado) if resultado.ndim == 0 else resultado
+
+    def converter(
+            self,
+            valores: Union[float, ndarray],
+            moedas: Union[str, list[str]],
+            datas: Optional[Union[date, list[date], ndarray]] = None
+    ) -> Union[float, ndarray]:
+        # Converter para reais valores (datas × instrumentos) denominados nas respectivas moedas
+        return asarray(valores, dtype=float) * self.reais_por_unidade(moedas, datas)
+
+
+class BaseMercado:
+    """
+    Conjunto das séries de mercado (preços, câmbio e curvas) indexadas por data e instrumento.
+    """
+    def __init__(
+            self,
+            acoes_br: DataFrame,
+            acoes_us: DataFrame,
+            fx: DataFrame,
+            di: DataFrame,
+            treasury: DataFrame
+    ):
+        self.acoes_br = SerieMercado(acoes_br, Colunas.ATIVO, Colunas.PRECO)
+        self.acoes_us = SerieMercado(acoes_us, Colunas.ATIVO, Colunas.PRECO)
+        self.fx = SerieCambio(fx)
+        self.di = CurvaJuros(di, 252, int)
+        self.treasury = CurvaJuros(treasury, 1, converter_prazo_treasury)
+
+
+def converter_prazo_treasury(prazo: str) -> float:
+    # Converter vértices como "6M" e "10Y" (eventualmente com espaços) para anos
+    prazo = prazo.strip()
+    return int(prazo.replace("Y", "")) if "Y" in prazo else int(prazo.replace("M", ""))/12
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from hashlib import sha256
+from numpy import empty, load, nan, save
+from pandas import DataFrame, Series, factorize
+
+
+class SnapshotInputs:
+    """
+    Snapshot colunar da planilha de inputs em arquivos .npy por coluna, identificado pelo hash da planilha.
+    """
+    _DIRETORIO = ".snapshot"
+    _MANIFESTO = "manifesto.json"
+
+    def __init__(self, caminho_planilha: str):
+        self.caminho_planilha = caminho_planilha
+        self.hash_planilha = self.calcular_hash(caminho_planilha)
+        self.diretorio_raiz = os.path.join(os.path.dirname(caminho_planilha), self._DIRETORIO)
+        self.diretorio = os.path.join(self.diretorio_raiz, self.hash_planilha)
+        self._tabelas: dict[str, dict] = {}
+
+    @staticmethod
+    def calcular_hash(caminho: str) -> str:
+        hash_arquivo = sha256()
+        with open(caminho, "rb") as arquivo:
+            for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+                hash_arquivo.update(bloco)
+        return hash_arquivo.hexdigest()
+
+    @property
+    def existe(self) -> bool:
+        return os.path.isfile(os.path.join(self.diretorio, self._MANIFESTO))
+
+    def gerar(self, tabelas: dict[str, DataFrame]) -> str:
+        # Gravar em diretório temporário para não deixar snapshot parcial em caso de falha
+        diretorio_temp = f"{self.diretorio}.tmp"
+        shutil.rmtree(diretorio_temp, ignore_errors=True)
+        os.makedirs(diretorio_temp)
+
+        manifesto = {"hash": self.hash_planilha, "tabelas": {}}
+        for nome, df in tabelas.items():
+            os.makedirs(os.path.join(diretorio_temp, nome))
+            manifesto["tabelas"][nome] = self._gravar_tabela(df, os.path.join(diretorio_temp, nome))
+
+        with open(os.path.join(diretorio_temp, self._MANIFESTO), "w", encoding="utf-8") as arquivo:
+            json.dump(manifesto, arquivo, ensure_ascii=False)
+
+        # Substituir snapshots antigos pelo novo
+        for antigo in os.listdir(self.diretorio_raiz):
+            caminho_antigo = os.path.join(self.diretorio_raiz, antigo)
+            if caminho_antigo != diretorio_temp:
+                shutil.rmtree(caminho_antigo, ignore_errors=True)
+        os.replace(diretorio_temp, self.diretorio)
+
+        return self.diretorio
+
+    def abrir(self) -> "SnapshotInputs":
+        assert self.existe, "Snapshot inexistente para a versão atual da planilha."
+        with open(os.path.join(self.diretorio, self._MANIFESTO), encoding="utf-8") as arquivo:
+            manifesto = json.load(arquivo)
+
+        # Mapear colunas em memória apenas uma vez
+        for nome, meta in manifesto["tabelas"].items():
+            colunas = {}
+            for i, coluna in enumerate(meta["colunas"]):
+                valores = load(os.path.join(self.diretorio, nome, f"{i}.npy"), mmap_mode="r")
+                if coluna["tipo"] == "categorico":
+                    # Manter dtype object, evitando inferência automática de tipos pelo pandas
+                    valores = Series(self._decodificar_categorias(valores, coluna["categorias"]), dtype=object)
+                colunas[coluna["nome"]] = valores
+            self._tabelas[nome] = colunas
+
+        return self
+
+    def tabela(self, nome: str) -> DataFrame:
+        assert nome in self._tabelas, f"Tabela {nome} não encontrada no snapshot."
+        return DataFrame(self._tabelas[nome], copy=False)
+
+    @classmethod
+    def _gravar_tabela(cls, df: DataFrame, diretorio: str) -> dict:
+        colunas = []
+        for i, nome in enumerate(df.columns):
+            serie = df[nome]
+            if serie.dtype == object:
+                codigos, categorias = factorize(serie)
+                save(os.path.join(diretorio, f"{i}.npy"), codigos)
+                colunas.append({
+                    "nome": nome,
+                    "tipo": "categorico",
+                    "categorias": [cls._serializar_categoria(c) for c in categorias]
+                })
+            else:
+                save(os.path.join(diretorio, f"{i}.npy"), serie.to_numpy())
+                colunas.append({"nome": nome, "tipo": "nativo"})
+
+        return {"linhas": len(df), "colunas": colunas}
+
+    @staticmethod
+    def _serializar_categoria(valor) -> object:
+        if isinstance(valor, datetime):
+            return {"datetime": valor.isoformat()}
+        return valor.item() if hasattr(valor, "item") else valor
+
+    @staticmethod
+    def _decodificar_categorias(codigos, categorias: list):
+        valores_categorias = empty(len(categorias), dtype=object)
+        valores_categorias[:] = [
+            datetime.fromisoformat(c["datetime"]) if isinstance(c, dict) else c
+            for c in categorias
+        ]
+
+        # Códigos negativos representam valores ausentes
+        valores = empty(len(codigos), dtype=object)
+        valores[:] = nan
+        validos = codigos >= 0
+        valores[validos] = valores_categorias[codigos[validos]]
+
+        # Compartilhado entre chamadas, portanto somente leitura assim como as colunas mapeadas
+        valores.setflags(write=False)
+        return valores